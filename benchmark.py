@@ -0,0 +1,353 @@
+"""
+Benchmarks for the game code in current_code.py. Run it with:
+
+    python benchmark.py [--counts 100,1000,10000,100000] [--backends python,numpy,analytic] [--frames 60]
+                        [--output benchmark_results.json] [--draw-paths] [--collision] [--entity-memory]
+                        [--multi-ball]
+
+By default it runs the particle system suite and stores the results as JSON, so runs from before and after
+a change to the particle code can be compared. --draw-paths compares draw.circle against the sprite atlas instead,
+--collision times the ball against paddle collision test, --entity-memory measures the bytes per game object,
+and --multi-ball times headless frames of multi-ball mode for growing numbers of balls.
+"""
+
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pygame
+
+import current_code
+from current_code import particle_backends
+
+
+def fill_particle_system(backend, particle_count, *, use_sprites, seed=0, waves=10):
+    """
+    Spawns [particle_count] background particles, in [waves] waves so they are spread over the ramp.
+    """
+
+    random.seed(seed)
+    particle_system = particle_backends[backend](lifetime=2, vel=(2, 0), start_color=(255, 255, 255),
+                                                 end_color=(0, 0, 0), start_radius=2, end_radius=4,
+                                                 particle_count=particle_count // waves, capacity=particle_count,
+                                                 use_sprites=use_sprites)
+    particle_system.random.seed(seed)
+
+    previous_render = current_code.settings.render
+    current_code.settings.render = False
+    for i in range(waves):
+        particle_system.create_background_particles(1)
+        particle_system.update(0.1)
+    current_code.settings.render = previous_render
+
+    return particle_system
+
+
+def benchmark_particle_drawing(particle_counts=(1_000, 10_000, 50_000), *, frames=20):
+    """
+    Compares drawing particles one draw.circle at a time against drawing them from the sprite atlas with one blits call.
+    Returns {(backend, particle count, use_sprites): median milliseconds per frame}.
+    """
+
+    surface = pygame.Surface((current_code.width, current_code.height))
+    results = {}
+
+    for backend in available_backends():
+        for particle_count in particle_counts:
+            for use_sprites in (False, True):
+                particle_system = fill_particle_system(backend, particle_count, use_sprites=use_sprites)
+                particle_system.render(surface)
+
+                frame_times = []
+                for i in range(frames):
+                    start = time.perf_counter()
+                    particle_system.render(surface)
+                    frame_times.append(time.perf_counter() - start)
+
+                results[(backend, particle_count, use_sprites)] = statistics.median(frame_times) * 1000
+
+    return results
+
+
+def available_backends():
+    return [backend for backend in particle_backends if backend != "numpy" or current_code.np is not None]
+
+
+class ParticleWorkload:
+    """
+    One frame of particles like in a match, scaled up so about [particle_count] particles are alive:
+    background particles every frame, a trail following a moving point, and a collision burst twice a second.
+    """
+
+    lifetime = 1
+
+    def __init__(self, backend, particle_count, *, seed=0):
+        random.seed(seed)
+        self.particle_system = particle_backends[backend](acc=(0, 100), lifetime=self.lifetime, speed=100,
+                                                          vel=(2, 0), start_color=(255, 255, 255),
+                                                          end_color=(0, 0, 0), start_radius=2, end_radius=4,
+                                                          particle_count=max(particle_count // 2, 1),
+                                                          capacity=particle_count * 2)
+        self.particle_system.random.seed(seed)
+        self.frame = 0
+
+    def run_frame(self, dt):
+        particle_system = self.particle_system
+
+        particle_system.create_background_particles(dt)
+        particle_system.create_trail_particles(pos=(self.frame % current_code.width, current_code.height / 2), dt=dt)
+        if self.frame % 30 == 0:
+            particle_system.create_collision_particles(pos=(current_code.width / 2, current_code.height / 2))
+        particle_system.update(dt)
+
+        self.frame += 1
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def benchmark_particle_system(backend, particle_count, *, render, frames=60, seed=0):
+    """
+    Runs [frames] frames of ParticleWorkload after one lifetime of warming up, twice:
+    once timed, and once traced by tracemalloc for the memory numbers.
+    Rendering goes to an off-screen surface of the window's size.
+    """
+
+    dt = 1 / current_code.fps
+    warmup_frames = round(ParticleWorkload.lifetime / dt)
+
+    previous_render, previous_screen = current_code.settings.render, current_code.screen
+    current_code.settings.render = render
+    current_code.screen = pygame.Surface((current_code.width, current_code.height))
+    try:
+        workload = ParticleWorkload(backend, particle_count, seed=seed)
+        for i in range(warmup_frames):
+            workload.run_frame(dt)
+
+        frame_times = []
+        for i in range(frames):
+            start = time.perf_counter()
+            workload.run_frame(dt)
+            frame_times.append(time.perf_counter() - start)
+        live_particles = len(workload.particle_system)
+
+        workload = ParticleWorkload(backend, particle_count, seed=seed)
+        for i in range(warmup_frames):
+            workload.run_frame(dt)
+
+        gc.collect()
+        particles_allocated_before = workload.particle_system.allocated
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.start()
+        try:
+            for i in range(frames):
+                workload.run_frame(dt)
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        gc.collect()
+        blocks_after = sys.getallocatedblocks()
+        particles_allocated = workload.particle_system.allocated - particles_allocated_before
+    finally:
+        current_code.settings.render, current_code.screen = previous_render, previous_screen
+
+    frame_times.sort()
+    return {
+        "backend": backend,
+        "particle_count": particle_count,
+        "render": render,
+        "frames": frames,
+        "live_particles": live_particles,
+        "frame_ms": {
+            "p50": percentile(frame_times, 0.5) * 1000,
+            "p90": percentile(frame_times, 0.9) * 1000,
+            "p99": percentile(frame_times, 0.99) * 1000,
+            "max": frame_times[-1] * 1000,
+        },
+        "particles_allocated_per_frame": particles_allocated / frames,
+        "net_blocks_per_frame": (blocks_after - blocks_before) / frames,
+        "peak_traced_bytes": peak_bytes,
+    }
+
+
+def run_particle_suite(*, particle_counts=(100, 1_000, 10_000, 100_000), backends=None, frames=60, seed=0):
+    results = []
+    for backend in backends or available_backends():
+        for particle_count in particle_counts:
+            for render in (False, True):
+                result = benchmark_particle_system(backend, particle_count, render=render, frames=frames, seed=seed)
+                print(f"{backend:>8} {particle_count:>7} particles, render {'on ' if render else 'off'}: "
+                      f"p50 {result['frame_ms']['p50']:8.2f} ms, p99 {result['frame_ms']['p99']:8.2f} ms, "
+                      f"{result['particles_allocated_per_frame']:7.1f} particles allocated per frame, "
+                      f"peak {result['peak_traced_bytes'] / 1024:8.0f} KiB")
+                results.append(result)
+    return results
+
+
+def benchmark_ball_collision(calls=200_000):
+    """
+    Times Ball.does_collide against a paddle for balls missing it, touching it, overlapping a corner and so on.
+    Returns {case: (nanoseconds per call, memory blocks still allocated per call)}.
+    """
+
+    paddle = current_code.Paddle(x=50, y=250, paddle_width=5, paddle_height=60, speed=500,
+                                 up_key=pygame.K_w, down_key=pygame.K_s)
+    ball = current_code.Ball(x=0, y=0, radius=10, speed_x=200, trail=None, collision=None)
+
+    cases = {
+        "far away": (300, 300),
+        "next to a corner": (60.5, 212),
+        "touching a side": (62.5, 250),
+        "overlapping a corner": (58.5, 214),
+        "overlapping a side": (60, 250),
+        "center inside": (50, 250),
+    }
+
+    results = {}
+    for case, (ball.x, ball.y) in cases.items():
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+        start = time.perf_counter()
+        for i in range(calls):
+            ball.does_collide(paddle)
+        seconds = time.perf_counter() - start
+        blocks_after = sys.getallocatedblocks()
+        results[case] = (seconds / calls * 1e9, (blocks_after - blocks_before) / calls)
+
+    return results
+
+
+def measure_entity_memory(count=10_000):
+    """
+    Creates [count] of each kind of game object and returns {kind: bytes per object} as measured by tracemalloc.
+    Particles share one ramp, like they do in a particle system, so it is not counted.
+    """
+
+    ramp = current_code.ParticleRamp(lifetime=1, start_color=(255, 255, 255), end_color=(0, 0, 0),
+                                     start_radius=2, end_radius=4)
+    factories = {
+        "Paddle": lambda: current_code.Paddle(x=50, y=250, paddle_width=5, paddle_height=60, speed=500,
+                                              up_key=pygame.K_w, down_key=pygame.K_s),
+        "Ball": lambda: current_code.Ball(x=400, y=250, radius=10, speed_x=200, trail=None, collision=None),
+        "Particle": lambda: current_code.Particle(lifetime=1, pos=(400, 250), vel=(10, 10), start_color=None,
+                                                  end_color=None, start_radius=None, ramp=ramp),
+        "Color": lambda: current_code.Color((255, 255, 255)),
+    }
+
+    results = {}
+    for kind, factory in factories.items():
+        gc.collect()
+        tracemalloc.start()
+        try:
+            entities = [factory() for i in range(count)]
+            entity_bytes = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del entities
+        # The list holding them is not part of the objects.
+        results[kind] = entity_bytes / count - 8
+
+    return results
+
+
+def benchmark_multi_ball(ball_counts=(10, 100, 1_000), *, frames=120, seed=0):
+    """
+    Plays [frames] headless frames of multi-ball mode for each ball count, once the balls have started moving.
+    Returns {ball count: (milliseconds per frame, of which milliseconds in GameScene.simulate_balls)}.
+    The simulate_balls part should grow about linearly with the ball count, the rest is mostly their particles.
+    """
+
+    previous_render, previous_ball_count = current_code.settings.render, current_code.settings.ball_count
+    current_code.settings.render = False
+    results = {}
+    try:
+        for ball_count in ball_counts:
+            current_code.settings.ball_count = ball_count
+            random.seed(seed)
+            game = current_code.GameScene(sys.maxsize, controller=current_code.follow_ball_controller)
+
+            simulate_balls = game.simulate_balls
+            ball_seconds = 0
+
+            def timed_simulate_balls(dt):
+                nonlocal ball_seconds
+                ball_start = time.perf_counter()
+                simulate_balls(dt)
+                ball_seconds += time.perf_counter() - ball_start
+
+            while not game.ball.in_play:
+                game.step(current_code.physics_dt)
+
+            game.simulate_balls = timed_simulate_balls
+
+            start = time.perf_counter()
+            for i in range(frames):
+                game.step(current_code.physics_dt)
+            seconds = time.perf_counter() - start
+
+            results[ball_count] = (seconds / frames * 1000, ball_seconds / frames * 1000)
+    finally:
+        current_code.settings.render, current_code.settings.ball_count = previous_render, previous_ball_count
+
+    return results
+
+
+def get_option(argv, name, default):
+    return argv[argv.index(name) + 1] if name in argv else default
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if "--draw-paths" in argv:
+        print("Drawing particles, median ms per frame")
+        results = benchmark_particle_drawing()
+        for (backend, particle_count, use_sprites), milliseconds in results.items():
+            draw_path = "sprite atlas" if use_sprites else "draw.circle"
+            print(f"{backend:>8} {particle_count:>7} particles {draw_path:>12}: {milliseconds:8.2f} ms")
+        return
+
+    if "--collision" in argv:
+        print("Ball against paddle collision test")
+        for case, (nanoseconds, blocks) in benchmark_ball_collision().items():
+            print(f"{case:>20}: {nanoseconds:6.0f} ns per call, {blocks:.3f} blocks allocated per call")
+        return
+
+    if "--entity-memory" in argv:
+        print("Memory per game object")
+        for kind, entity_bytes in measure_entity_memory().items():
+            print(f"{kind:>8}: {entity_bytes:6.0f} bytes")
+        return
+
+    if "--multi-ball" in argv:
+        print("Multi-ball mode, headless")
+        for ball_count, (milliseconds, ball_milliseconds) in benchmark_multi_ball().items():
+            print(f"{ball_count:>5} balls: {milliseconds:8.2f} ms per frame, {ball_milliseconds:7.2f} ms of it for the "
+                  f"balls, {ball_milliseconds / ball_count * 1000:5.1f} us per ball")
+        return
+
+    particle_counts = [int(count) for count in get_option(argv, "--counts", "100,1000,10000,100000").split(",")]
+    backends = get_option(argv, "--backends", ",".join(available_backends())).split(",")
+    frames = int(get_option(argv, "--frames", "60"))
+    output = get_option(argv, "--output", "benchmark_results.json")
+
+    results = run_particle_suite(particle_counts=particle_counts, backends=backends, frames=frames)
+
+    with open(output, "w") as file:
+        json.dump({
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": current_code.np.__version__ if current_code.np is not None else None,
+            "results": results,
+        }, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,169 @@
+import time
+
+import_start_time = time.perf_counter()
+
 import pygame
 import random
+import concurrent.futures
 import math
-
-pygame.init()
-pygame.display.set_caption('Pong')
+import os
+import subprocess
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    # Only needed for NumpyParticleSystem.
+    np = None
+
+# Importing this file only defines things. The window, fonts and sounds are set up by setup(), which main() calls.
 
 width = 800
 height = 500
-screen = pygame.display.set_mode((width, height))
+screen: pygame.Surface = None
 
 background_color = (0, 0, 0)
 
 fps = 60
 clock = pygame.time.Clock()
 
-fonts = [pygame.font.SysFont("arial", font_size) for font_size in range(300)]
+# The match is simulated in fixed steps of physics_dt seconds, however long each frame takes to draw.
+physics_dt = 1 / fps
+# A frame that took longer than this is only caught up to this point, so slow frames do not snowball.
+max_physics_steps_per_frame = 5
+
+
+
+class FontCache:
+    """
+    Loads each font size the first time it is asked for, instead of loading every size up front.
+    Only the most recently used [max_fonts] sizes are kept around.
+    """
+
+    def __init__(self, name="arial", *, max_fonts=8):
+        self.name = name
+        self.max_fonts = max_fonts
+        self.fonts = OrderedDict()
+        self.lock = threading.Lock()
+        # SDL_ttf can not open fonts from two threads at once, so loading has its own lock.
+        self.load_lock = threading.Lock()
+
+    def get(self, font_size):
+        with self.lock:
+            font = self.fonts.get(font_size)
+            if font is not None:
+                self.fonts.move_to_end(font_size)
+                return font
+
+        with self.load_lock:
+            # Another thread might have loaded the same size while this one waited.
+            with self.lock:
+                font = self.fonts.get(font_size)
+            if font is None:
+                font = pygame.font.SysFont(self.name, font_size)
+
+            with self.lock:
+                self.fonts[font_size] = font
+                self.fonts.move_to_end(font_size)
+                while len(self.fonts) > self.max_fonts:
+                    self.fonts.popitem(last=False)
+        return font
+
+    def __getitem__(self, font_size):
+        return self.get(font_size)
+
+    def prewarm(self, font_sizes, *, background=True):
+        """
+        Loads the given sizes ahead of time. Runs on a daemon thread unless [background] is False.
+        """
+
+        def load_all():
+            for font_size in font_sizes:
+                self.get(font_size)
+
+        if not background:
+            load_all()
+            return None
+
+        thread = threading.Thread(target=load_all, name="font-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+
+def measure_font_cold_start(font_sizes=(45, 72)):
+    """
+    Returns (eager_seconds, lazy_seconds): the time the old eager 300 font list took to load,
+    compared to loading only the sizes that are actually drawn.
+    Each is measured in a fresh Python process, so both pay for SysFont's one-time scan of the system fonts.
+    """
+
+    eager_seconds = time_in_fresh_process("[pygame.font.SysFont('arial', font_size) for font_size in range(300)]")
+    lazy_seconds = time_in_fresh_process(f"FontCache().prewarm({tuple(font_sizes)!r}, background=False)")
+    return eager_seconds, lazy_seconds
+
+
+def time_in_fresh_process(statement):
+    """
+    Runs [statement] in a new Python process, with pygame.font initialized and this module imported,
+    and returns how many seconds the statement took.
+    """
+
+    code = ("import time\nimport pygame\nfrom current_code import FontCache\npygame.font.init()\n"
+            f"start = time.perf_counter()\n{statement}\nprint(time.perf_counter() - start)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1"),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.split()[-1])
+
+
+fonts = FontCache()
+
+
+class TextCache:
+    """
+    Keeps rendered text surfaces, so the same message is only rasterized once instead of every frame.
+    The least recently used surfaces are dropped once there are more than [max_surfaces].
+    """
+
+    def __init__(self, font_cache, *, max_surfaces=64):
+        self.font_cache = font_cache
+        self.max_surfaces = max_surfaces
+        self.surfaces = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, message, font_size, color, antialias=True):
+        """
+        Returns (surface, rect) for the message. The rect is a copy, so callers are free to move it.
+        """
+
+        key = (str(message), font_size, color if isinstance(color, str) else tuple(color), antialias)
+
+        cached = self.surfaces.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        else:
+            self.misses += 1
+            text_surface = self.font_cache.get(font_size).render(key[0], antialias, color)
+            cached = (text_surface, text_surface.get_rect())
+            self.surfaces[key] = cached
+            while len(self.surfaces) > self.max_surfaces:
+                self.surfaces.popitem(last=False)
+
+        text_surface, text_rect = cached
+        return text_surface, text_rect.copy()
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+text_cache = TextCache(fonts)
 
 
 # Note that Sound and Settings are placed abnormally high in the main file
@@ -22,34 +171,148 @@ fonts = [pygame.font.SysFont("arial", font_size) for font_size in range(300)]
 
 
 # Create directory resources, then add the music/sound files inside to make it work.
+#    Missing files are reported and stay silent, instead of stopping the game from starting.
+
+class SilentSound:
+    """
+    Stands in for a sound that has not finished loading, or could not be loaded.
+    """
+
+    def play(self, *args, **kwargs):
+        return None
+
+    def stop(self):
+        pass
+
+    def set_volume(self, volume):
+        pass
+
+
+class LoadingSound:
+    """
+    Plays nothing until the sound has been decoded on the asset loader's threads, then plays the real sound.
+    """
+
+    def __init__(self):
+        self.sound = SilentSound()
+
+    def play(self, *args, **kwargs):
+        return self.sound.play(*args, **kwargs)
+
+    def stop(self):
+        self.sound.stop()
+
+    def set_volume(self, volume):
+        self.sound.set_volume(volume)
+
+
+class AssetLoader:
+    """
+    Decodes sounds on a thread pool, so the window can show up before every file is loaded.
+    The time each asset took to load is kept in [load_times], and anything that failed in [errors].
+    """
+
+    def __init__(self, *, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asset-loader")
+        self.futures = []
+
+        self.load_times = {}
+        self.errors = {}
+
+    def load_sound(self, path, *, volume=None) -> LoadingSound:
+        loading_sound = LoadingSound()
+        self.futures.append(self.executor.submit(self.decode_sound, path, volume, loading_sound))
+        return loading_sound
+
+    def decode_sound(self, path, volume, loading_sound: LoadingSound):
+        start = time.perf_counter()
+        try:
+            decoded_sound = pygame.mixer.Sound(path)
+        except (pygame.error, FileNotFoundError) as error:
+            self.errors[path] = error
+            return
+        finally:
+            self.load_times[path] = time.perf_counter() - start
+
+        if volume is not None:
+            decoded_sound.set_volume(volume)
+        loading_sound.sound = decoded_sound
+
+    def load_music(self, path):
+        """
+        Music is streamed by pygame rather than decoded up front, so it is cheap to load right away.
+        Returns whether the music could be loaded.
+        """
+
+        start = time.perf_counter()
+        try:
+            pygame.mixer.music.load(path)
+        except (pygame.error, FileNotFoundError) as error:
+            self.errors[path] = error
+            return False
+        finally:
+            self.load_times[path] = time.perf_counter() - start
+        return True
+
+    def wait(self, timeout=None):
+        concurrent.futures.wait(self.futures, timeout=timeout)
+
+    def report(self):
+        for path, seconds in self.load_times.items():
+            status = f"failed ({self.errors[path]})" if path in self.errors else "loaded"
+            print(f"{path}: {status} in {seconds * 1000:.1f} ms")
+
 
 class Sound:
     def __init__(self, ball_bounce: str, score_point: str, score_point_volume: float, game_start: str, countdown: str,
-                 game_over: str, music: str):
-        self.ball_bounce = pygame.mixer.Sound(ball_bounce)
-        self.score_point = pygame.mixer.Sound(score_point)
+                 game_over: str, music: str, *, loader: AssetLoader):
+        self.ball_bounce = loader.load_sound(ball_bounce)
+        self.score_point = loader.load_sound(score_point, volume=score_point_volume)
 
-        self.score_point.set_volume(score_point_volume)
+        self.game_start = loader.load_sound(game_start)
+        self.countdown = loader.load_sound(countdown)
+        self.game_over = loader.load_sound(game_over)
 
-        self.game_start = pygame.mixer.Sound(game_start)
-        self.countdown = pygame.mixer.Sound(countdown)
-        self.game_over = pygame.mixer.Sound(game_over)
+        # None if the music file could not be loaded, the music toggle then does nothing.
+        self.music = music if loader.load_music(music) else None
 
-        self.music = music
+
+class SilentSounds:
+    """
+    The sounds used until setup() has loaded the real ones, so the game classes can be used without audio.
+    """
+
+    def __init__(self):
+        self.ball_bounce = SilentSound()
+        self.score_point = SilentSound()
+        self.game_start = SilentSound()
+        self.countdown = SilentSound()
+        self.game_over = SilentSound()
+
+        self.music = None
 
 
-sound = Sound(ball_bounce="resources/ball_bounce.wav", score_point="resources/score_point.wav", score_point_volume=0.1,
-              game_start="resources/game_start.wav", countdown="resources/countdown.wav",
-              game_over="resources/game_over.wav", music="resources/music.wav")
+asset_loader = AssetLoader()
 
-pygame.mixer.music.load(sound.music)
+sound: Sound | SilentSounds = SilentSounds()
 
 
 class Settings:
-    def __init__(self, *, play_music, music_toggle_key, pause_key):
+    def __init__(self, *, play_music, music_toggle_key, pause_key, render=True, particle_backend="python",
+                 show_particle_quality=False, ball_count=1):
         self.play_music = play_music
         self.music_toggle_key = music_toggle_key
         self.pause_key = pause_key
+        self.show_particle_quality = show_particle_quality
+
+        # Key of particle_backends, "python", "numpy" or "analytic"
+        self.particle_backend = particle_backend
+
+        # Turned off for headless runs, the game logic then runs without drawing anything.
+        self.render = render
+
+        # More than one ball turns on multi-ball mode.
+        self.ball_count = ball_count
 
 
 settings = Settings(play_music=False, music_toggle_key=pygame.K_m, pause_key=pygame.K_SPACE)
@@ -58,100 +321,325 @@ settings = Settings(play_music=False, music_toggle_key=pygame.K_m, pause_key=pyg
 ------------------------------------------------------------
 ------------------------------------------------------------
 ------------------------------------------------------------
-Later on, we will move to a class based menu system. For now we opt for functions for simplicity. 
+Each screen of the game is a scene. A scene runs until it is done, then returns the scene to run next,
+so run_scenes can drive the whole game from one flat loop instead of the screens calling each other.
 ------------------------------------------------------------
 ------------------------------------------------------------
 ------------------------------------------------------------
 '''
 
 
-def game_loop(score_required_to_win):
-    paddle_1 = Paddle(x=50, y=height / 2, paddle_width=5, paddle_height=60, speed=500, up_key=pygame.K_w,
-                      down_key=pygame.K_s, color=(255, 100, 100))
-    paddle_2 = Paddle(x=width - 50, y=height / 2, paddle_width=5, paddle_height=60, speed=500, up_key=pygame.K_UP,
-                      down_key=pygame.K_DOWN, color=(100, 255, 100))
+class Scene(ABC):
+    @abstractmethod
+    def run(self):
+        """
+        Runs the scene until it is done, then returns the next scene, or None to stop.
+        """
 
-    collision_particle_system = ParticleSystem(acc=(0, 100), lifetime=1, speed=100, start_color=(255, 255, 255),
-                                               end_color=(0, 0, 0), start_radius=2, end_radius=4, particle_count=20)
 
-    trail_particle_system = ParticleSystem(lifetime=1, start_color=(255, 255, 255), end_color=(0, 0, 0),
-                                           start_radius=5, end_radius=0, border_width=0)
+def run_scenes(scene: Scene):
+    while scene is not None:
+        scene = scene.run()
 
-    ball = Ball(x=width / 2, y=height / 2, radius=10, speed_x=200, color=(0, 255, 255),
-                trail=trail_particle_system, collision=collision_particle_system)
 
-    background_particle_system = ParticleSystem(lifetime=2, vel=(2, 0), start_color=(255, 255, 255),
-                                                end_color=(0, 0, 0), start_radius=2, end_radius=4, particle_count=60)
+class MenuScene(Scene):
+    def __init__(self, score_required_to_win, *, controller=None):
+        self.score_required_to_win = score_required_to_win
+        self.controller = controller
 
-    sound.game_start.play()
-    if settings.play_music:
-        pygame.mixer.music.play(loops=-1)
+    def run(self):
+        wait_on_static_screen(self.draw)
+        return GameScene(self.score_required_to_win, controller=self.controller)
 
-    while True:
-        
-        for event in pygame.event.get():
-            quit_program_if_correct_key_pressed_or_screen_exit(event)
-            end_music_if_key_pressed(event)
-            pause_game_if_key_pressed(event)
+    def draw(self):
+        screen.fill(background_color)
+
+        draw_text_centered("--- P O N G ---", width / 2, height / 2, "white", display_rect=True, rect_color="blue",
+                           rect_border_width=5, rect_dx=50, rect_dy=50)
+
+        draw_text_centered(" Press [Space] to start", width / 2, height * 3 / 4, "white", display_rect=True,
+                           rect_color="red", rect_border_width=5, rect_dx=5, rect_dy=5, font_size=45)
+
+
+def check_ball_count(ball_count):
+    """
+    Raises a ValueError unless a match can be played with [ball_count] balls.
+    """
+
+    if ball_count < 1:
+        raise ValueError(f"ball_count must be at least 1, not {ball_count}")
+
+
+class GameScene(Scene):
+    def __init__(self, score_required_to_win, *, controller=None):
+        check_ball_count(settings.ball_count)
+
+        self.score_required_to_win = score_required_to_win
+
+        # Called every frame with the scene, returns the pressed keys. None means the keyboard is used.
+        self.controller = controller
+
+        self.paddle_1 = Paddle(x=50, y=height / 2, paddle_width=5, paddle_height=60, speed=500, up_key=pygame.K_w,
+                               down_key=pygame.K_s, color=(255, 100, 100))
+        self.paddle_2 = Paddle(x=width - 50, y=height / 2, paddle_width=5, paddle_height=60, speed=500,
+                               up_key=pygame.K_UP, down_key=pygame.K_DOWN, color=(100, 255, 100))
+
+        # Shared by all balls, so multi-ball mode still draws all particles with one blits call per system.
+        self.collision_particle_system = new_particle_system(acc=(0, 100), lifetime=1, speed=100,
+                                                             start_color=(255, 255, 255), end_color=(0, 0, 0),
+                                                             start_radius=2, end_radius=4, particle_count=20)
+
+        self.trail_particle_system = new_particle_system(lifetime=1, start_color=(255, 255, 255),
+                                                         end_color=(0, 0, 0), start_radius=5, end_radius=0,
+                                                         border_width=0)
+
+        # With many balls, they get smaller, so together they never cover more than a few percent of the screen.
+        ball_radius = min(10, math.sqrt(width * height * 0.05 / (math.pi * settings.ball_count)))
+
+        self.ball = Ball(x=width / 2, y=height / 2, radius=ball_radius, speed_x=200, color=(0, 255, 255),
+                         trail=self.trail_particle_system, collision=self.collision_particle_system)
+
+        # In multi-ball mode, the other balls start from random points around the center.
+        self.balls = [self.ball]
+        for i in range(settings.ball_count - 1):
+            self.balls.append(Ball(x=random.uniform(width / 4, width * 3 / 4),
+                                   y=random.uniform(height / 4, height * 3 / 4), radius=ball_radius, speed_x=200,
+                                   color=(0, 255, 255), trail=self.trail_particle_system,
+                                   collision=self.collision_particle_system))
+
+        self.broadphase = SpatialHash(cell_size=4 * ball_radius)
+
+        self.background_particle_system = new_particle_system(lifetime=2, vel=(2, 0), start_color=(255, 255, 255),
+                                                              end_color=(0, 0, 0), start_radius=2, end_radius=4,
+                                                              particle_count=60)
+
+        self.started = False
+
+        # Simulated time that has passed but not been stepped yet. Starts at one step, so the first frame moves.
+        self.accumulator = physics_dt
+
+    def run(self):
+        if not self.started:
+            self.started = True
+
+            sound.game_start.play()
+            if settings.play_music and sound.music is not None:
+                pygame.mixer.music.play(loops=-1)
+
+        # Either a new match, or coming back from the pause screen, so the whole window has to be drawn.
+        renderer.invalidate()
+
+        # Restart the clock, so the time spent in the menu or paused is not measured as one long frame.
+        clock.tick()
+
+        while True:
+            for event in pygame.event.get():
+                quit_program_if_correct_key_pressed_or_screen_exit(event)
+                end_music_if_key_pressed(event)
+                if event.type == pygame.KEYDOWN and event.key == settings.pause_key:
+                    return PausedScene(self)
+
+            frame_start = time.perf_counter()
+
+            self.accumulator = min(self.accumulator, max_physics_steps_per_frame * physics_dt)
+            while self.accumulator >= physics_dt:
+                next_scene = self.step(physics_dt)
+                if next_scene is not None:
+                    return next_scene
+                self.accumulator -= physics_dt
+
+            if settings.render:
+                self.draw(self.accumulator / physics_dt)
+
+            renderer.end_frame(screen)
+            particle_governor.record_frame(time.perf_counter() - frame_start)
+            self.accumulator += clock.tick(fps) / 1000
+
+    def step(self, dt):
+        """
+        Advances the match by [dt] seconds without drawing anything.
+        Returns the game over scene once a player has won, else None.
+        """
+
+        self.background_particle_system.create_background_particles(dt)
+        self.background_particle_system.simulate(dt)
+
+        keys = self.controller(self) if self.controller is not None else None
+
+        self.paddle_1.move_on_input(dt, keys)
+        self.paddle_2.move_on_input(dt, keys)
+
+        if len(self.balls) == 1:
+            self.ball.simulate(dt, paddle_left=self.paddle_1, paddle_right=self.paddle_2)
+        else:
+            self.simulate_balls(dt)
+
+        self.trail_particle_system.simulate(dt)
+        self.collision_particle_system.simulate(dt)
+
+        for num_player, paddle in [(1, self.paddle_1), (2, self.paddle_2)]:
+            if paddle.score >= self.score_required_to_win:
+                if pygame.mixer.get_init():
+                    pygame.mixer.stop()
+                sound.game_over.play()
+                return GameOverScene(self.score_required_to_win, num_player, controller=self.controller)
+
+        return None
+
+    def simulate_balls(self, dt):
+        """
+        Multi-ball mode: finds the balls close to each other or to a paddle with the broadphase,
+        so the collision tests grow with the number of balls instead of its square, then moves every ball.
+        """
+
+        # The paddles are grown by the farthest any ball moves in this step, so the swept test still gets
+        # every paddle a ball can reach, while the balls themselves only take up the cells they overlap.
+        reach = max((abs(ball.vx) + abs(ball.vy)) * dt * (1 + ball.time_elapsed / 60) for ball in self.balls)
+
+        broadphase = self.broadphase
+        broadphase.clear()
+        for paddle in (self.paddle_1, self.paddle_2):
+            broadphase.insert(paddle, paddle.x_low - reach, paddle.y_low - reach, paddle.x_high + reach,
+                              paddle.y_high + reach)
+        for ball in self.balls:
+            broadphase.insert(ball, ball.x - ball.radius, ball.y - ball.radius, ball.x + ball.radius,
+                              ball.y + ball.radius)
+
+        nearby_paddles = {}
+        for a, b in broadphase.pairs():
+            if isinstance(a, Paddle):
+                a, b = b, a
+            if isinstance(b, Paddle):
+                nearby_paddles.setdefault(a, []).append(b)
+            elif a.in_play and b.in_play:
+                a.bounce_off_ball(b)
+
+        for ball in self.balls:
+            ball.simulate(dt, paddle_left=self.paddle_1, paddle_right=self.paddle_2,
+                          nearby_paddles=nearby_paddles.get(ball, ()))
+
+    def draw(self, alpha=1.0):
+        """
+        Draws the match [alpha] of the way from the state before the last step to the state after it.
+        """
 
         draw_background_game_loop()
 
-        background_particle_system.create_background_particles(1 / fps)
+        draw_scoreboard(self.paddle_1.score, self.paddle_2.score)
+        if settings.show_particle_quality:
+            renderer.mark_dirty(draw_text_centered(particle_governor.describe(), width / 2, height - 20, "gray",
+                                                   font_size=20))
+
+        self.background_particle_system.render(screen, alpha)
+
+        self.paddle_1.draw(alpha)
+        self.paddle_2.draw(alpha)
 
-        draw_scoreboard(paddle_1.score, paddle_2.score)
+        self.trail_particle_system.render(screen, alpha)
+        self.collision_particle_system.render(screen, alpha)
+        for ball in self.balls:
+            ball.draw(alpha)
 
-        background_particle_system.update(1 / fps)
 
-        paddle_1.update(1 / fps)
-        paddle_2.update(1 / fps)
+class PressedKeys:
+    """
+    Key state that does not come from the keyboard, indexed the same way as pygame.key.get_pressed().
+    """
 
-        ball.update(1 / fps, paddle_left=paddle_1, paddle_right=paddle_2)
+    def __init__(self, keys=()):
+        self.keys = set(keys)
 
-        if paddle_1.score >= score_required_to_win:
-            pygame.mixer.stop()
-            sound.game_over.play()
-            ended_game_loop(score_required_to_win, 1)
-        if paddle_2.score >= score_required_to_win:
-            pygame.mixer.stop()
-            sound.game_over.play()
-            ended_game_loop(score_required_to_win, 2)
+    def __getitem__(self, key):
+        return key in self.keys
 
-        pygame.display.update()
-        clock.tick(fps)
 
+def follow_ball_controller(game: GameScene):
+    """
+    Moves each paddle towards the closest ball on its half of the screen.
+    It only depends on the game state, so the same seed gives the same match with or without a window.
+    """
 
-def draw_scoreboard(score_1, score_2):
-    amount_offset_x = 50
-    amount_offset_y = 50
-    for (dx, score) in [(-amount_offset_x, score_1), (amount_offset_x, score_2)]:
-        draw_text_centered(score, width // 2 + dx, amount_offset_y, "white")
+    pressed_keys = []
+    for paddle in (game.paddle_1, game.paddle_2):
+        on_its_half = [ball for ball in game.balls if (ball.x < width / 2) == (paddle.x < width / 2)]
+        if not on_its_half:
+            continue
+        ball = min(on_its_half, key=lambda ball: abs(ball.x - paddle.x))
+        if ball.y < paddle.y - paddle.height / 4:
+            pressed_keys.append(paddle.up_key)
+        elif ball.y > paddle.y + paddle.height / 4:
+            pressed_keys.append(paddle.down_key)
+    return PressedKeys(pressed_keys)
+
+
+def run_headless(score_required_to_win=2, *, seed=None, controller=follow_ball_controller, max_frames=None,
+                 dt=physics_dt):
+    """
+    Plays one match with the real game logic, but without a window, sound or the fps cap, as fast as the CPU allows.
+    Every frame advances the game by one physics step, so the scores match a rendered run
+    with the same seed and controller. A larger [dt] simulates a match in fewer, coarser steps.
+    Returns (score of player 1, score of player 2, frames simulated, simulated frames per second).
+    """
 
+    previous_render = settings.render
+    settings.render = False
+    try:
+        if seed is not None:
+            random.seed(seed)
 
-def draw_background_game_loop():
-    screen.fill(background_color)
+        game = GameScene(score_required_to_win, controller=controller)
 
-    # Drawing gray-dashes
-    gray_color = (200, 200, 200)
+        frames = 0
+        start = time.perf_counter()
+        while max_frames is None or frames < max_frames:
+            frames += 1
+            if game.step(dt) is not None:
+                break
+        seconds = time.perf_counter() - start
+    finally:
+        settings.render = previous_render
 
-    length_gray_dash = 50
-    length_empty_space = 30
+    return game.paddle_1.score, game.paddle_2.score, frames, frames / seconds
 
-    width_dash = 5
 
-    for y in range(0, width, length_empty_space + length_gray_dash):
-        pygame.draw.rect(screen, gray_color, [width / 2 - width_dash / 2, y, width_dash, length_gray_dash])
+class PausedScene(Scene):
+    def __init__(self, game: GameScene):
+        self.game = game
 
+    def run(self):
+        draw_text_centered("Game Paused", width / 2, height / 2, "white", display_rect=False, font_size=45)
+        pygame.display.update()
 
-def ended_game_loop(score_required_to_win, num_player_won):
-    while True:
-        for event in pygame.event.get():
+        # The frozen frame and the overlay are already on screen, so sleep until an event arrives instead of spinning.
+        while True:
+            event = pygame.event.wait()
             quit_program_if_correct_key_pressed_or_screen_exit(event)
             end_music_if_key_pressed(event)
 
+            if event.type == pygame.KEYDOWN and event.key == settings.pause_key:
+                break
+
+            if event.type == pygame.WINDOWEXPOSED:
+                pygame.display.update()
+
+        return self.game
+
+
+class GameOverScene(Scene):
+    def __init__(self, score_required_to_win, num_player_won, *, controller=None):
+        self.score_required_to_win = score_required_to_win
+        self.num_player_won = num_player_won
+        self.controller = controller
+
+    def run(self):
+        wait_on_static_screen(self.draw)
+        return GameScene(self.score_required_to_win, controller=self.controller)
+
+    def draw(self):
         screen.fill(background_color)
 
-        draw_text_centered(f"Player {num_player_won} wins! ", width / 2, height * 1 / 4, "white", display_rect=True,
-                           rect_color="blue",
+        draw_text_centered(f"Player {self.num_player_won} wins! ", width / 2, height * 1 / 4, "white",
+                           display_rect=True, rect_color="blue",
                            rect_border_width=5, rect_dx=50, rect_dy=50)
 
         draw_text_centered(" Press [Space] to start", width / 2, height * 2 / 4, "white", display_rect=True,
@@ -160,38 +648,160 @@ def ended_game_loop(score_required_to_win, num_player_won):
         draw_text_centered(" Press [ESC] to end game", width / 2, height * 3 / 4, "white", display_rect=True,
                            rect_color="red", rect_border_width=5, rect_dx=5, rect_dy=5, font_size=45)
 
-        if pygame.key.get_pressed()[pygame.K_SPACE]:
-            game_loop(score_required_to_win)
 
-        pygame.display.update()
-        clock.tick(fps)
+def draw_scoreboard(score_1, score_2):
+    amount_offset_x = 50
+    amount_offset_y = 50
+    for (dx, score) in [(-amount_offset_x, score_1), (amount_offset_x, score_2)]:
+        renderer.mark_dirty(draw_text_centered(score, width // 2 + dx, amount_offset_y, "white"))
 
 
-def menu_loop(score_required_to_win):
-    while True:
-        for event in pygame.event.get():
-            quit_program_if_correct_key_pressed_or_screen_exit(event)
-            end_music_if_key_pressed(event)
+class BackgroundLayer:
+    """
+    The arena (fill color and gray center dashes) never changes during a match,
+    so it is drawn once into a surface and that surface is blitted every frame.
+    Changing any of the attributes below, the window size, or background_color,
+    rebuilds the surface on the next draw.
+    """
 
-        screen.fill(background_color)
+    def __init__(self, *, color=None, dash_color=(200, 200, 200), length_dash=50, length_empty_space=30, width_dash=5):
+        # None follows the module's background_color, which the other screens are filled with.
+        self.color = color
+        self.dash_color = dash_color
+        self.length_dash = length_dash
+        self.length_empty_space = length_empty_space
+        self.width_dash = width_dash
 
-        draw_text_centered("--- P O N G ---", width / 2, height / 2, "white", display_rect=True, rect_color="blue",
-                           rect_border_width=5, rect_dx=50, rect_dy=50)
+        self.surface = None
+        self.built_for = None
 
-        draw_text_centered(" Press [Space] to start", width / 2, height * 3 / 4, "white", display_rect=True,
-                           rect_color="red", rect_border_width=5, rect_dx=5, rect_dy=5, font_size=45)
+    def get_surface(self, size):
+        key = (tuple(size), self.fill_color(), self.dash_color, self.length_dash, self.length_empty_space,
+               self.width_dash)
+        if self.surface is None or key != self.built_for:
+            self.surface = self.build(size)
+            self.built_for = key
+        return self.surface
 
-        if pygame.key.get_pressed()[pygame.K_SPACE]:
-            game_loop(score_required_to_win)
+    def build(self, size):
+        surface_width, surface_height = size
+        surface = pygame.Surface(size).convert() if pygame.display.get_surface() else pygame.Surface(size)
+        surface.fill(self.fill_color())
+
+        for y in range(0, surface_height, self.length_empty_space + self.length_dash):
+            pygame.draw.rect(surface, self.dash_color,
+                             [surface_width / 2 - self.width_dash / 2, y, self.width_dash, self.length_dash])
+        return surface
+
+    def draw(self, surface):
+        surface.blit(self.get_surface(surface.get_size()), (0, 0))
+
+    def fill_color(self):
+        return background_color if self.color is None else self.color
+
+
+background_layer = BackgroundLayer()
 
-        pygame.display.update()
-        clock.tick(fps)
+
+class DirtyRectRenderer:
+    """
+    Opt-in renderer for the game loop, that only updates the parts of the window that changed.
+    Everything drawn in a frame is marked dirty. At the start of the next frame only those areas are
+    restored from the background layer, and the display is updated with the old and new dirty areas.
+    If the dirty area is more than [full_update_threshold] of the window, the whole window is updated instead.
+    """
+
+    def __init__(self, *, enabled=False, full_update_threshold=0.5):
+        self.enabled = enabled
+        self.full_update_threshold = full_update_threshold
+
+        self.dirty_rects = []
+        self.previous_dirty_rects = []
+        self.needs_full_update = True
+
+    def mark_dirty(self, rect):
+        if self.enabled:
+            self.dirty_rects.append(rect)
+
+    def mark_dirty_rects(self, rects):
+        if self.enabled:
+            self.dirty_rects.extend(rects)
+
+    def invalidate(self):
+        """
+        Forces the next frame to redraw and update the whole window, e.g. after a different screen was shown.
+        """
+
+        self.needs_full_update = True
+
+    def begin_frame(self, surface, background: BackgroundLayer):
+        if not self.enabled or self.needs_full_update:
+            background.draw(surface)
+            return
+
+        background_surface = background.get_surface(surface.get_size())
+        for rect in self.previous_dirty_rects:
+            surface.blit(background_surface, rect, rect)
+
+    def end_frame(self, surface):
+        if not self.enabled:
+            pygame.display.update()
+            return
+
+        rects = self.previous_dirty_rects + self.dirty_rects
+        dirty_area = sum(rect.width * rect.height for rect in rects)
+
+        window_area = surface.get_width() * surface.get_height()
+        if self.needs_full_update or dirty_area > self.full_update_threshold * window_area:
+            pygame.display.update()
+            self.needs_full_update = False
+        else:
+            pygame.display.update(rects)
+
+        self.previous_dirty_rects = self.dirty_rects
+        self.dirty_rects = []
+
+
+renderer = DirtyRectRenderer()
+
+
+def draw_background_game_loop():
+    renderer.begin_frame(screen, background_layer)
+
+
+def wait_on_static_screen(draw_screen, *, start_key=pygame.K_SPACE, animate=None, timeout_ms=500):
+    """
+    Draws a screen that does not change once, then sleeps on the event queue until [start_key] is pressed,
+    instead of redrawing the same frame 60 times a second.
+    [animate] is called every [timeout_ms] with no events, the display is only updated if it returns True.
+    """
+
+    draw_screen()
+    pygame.display.update()
+
+    while True:
+        event = pygame.event.wait(timeout_ms if animate is not None else 0)
+
+        if event.type == pygame.NOEVENT:
+            if animate is not None and animate():
+                pygame.display.update()
+            continue
+
+        quit_program_if_correct_key_pressed_or_screen_exit(event)
+        end_music_if_key_pressed(event)
+
+        if event.type == pygame.KEYDOWN and event.key == start_key:
+            return
+
+        if event.type == pygame.WINDOWEXPOSED:
+            # The window was covered up, the screen surface still holds the composed frame.
+            pygame.display.update()
 
 
 def draw_text_centered(message, x, y, color="white", *, display_rect=False, rect_color: str | tuple = None,
                        rect_border_width=0, rect_dx=0, rect_dy=0, font_size=72):
-    text_surface = fonts[font_size].render(str(message), True, color)
-    text_rect = text_surface.get_rect(center=(x, y))
+    text_surface, text_rect = text_cache.render(message, font_size, color)
+    text_rect.center = (x, y)
 
     if display_rect:
         # If checks to avoid copying rectangle if not needed, as copying a rectangle can be slow.
@@ -205,11 +815,13 @@ def draw_text_centered(message, x, y, color="white", *, display_rect=False, rect
 
             copied_rect.center = (cx, cy)
 
-            pygame.draw.rect(screen, rect_color, copied_rect, rect_border_width)
+            drawn_rect = pygame.draw.rect(screen, rect_color, copied_rect, rect_border_width)
         else:
-            pygame.draw.rect(screen, rect_color, text_rect, rect_border_width)
+            drawn_rect = pygame.draw.rect(screen, rect_color, text_rect, rect_border_width)
 
-    screen.blit(text_surface, text_rect)
+        return drawn_rect.union(screen.blit(text_surface, text_rect))
+
+    return screen.blit(text_surface, text_rect)
 
 
 def quit_program_if_correct_key_pressed_or_screen_exit(event):
@@ -225,28 +837,15 @@ def end_music_if_key_pressed(event):
     if event.type == pygame.KEYDOWN and event.key == settings.music_toggle_key:
         settings.play_music = not settings.play_music
 
+        if sound.music is None:
+            return
+
         if settings.play_music:
             pygame.mixer.music.play(loops=-1)
         else:
             pygame.mixer.music.stop()
 
 
-def pause_game_if_key_pressed(event):
-    if event.type == pygame.KEYDOWN and event.key == settings.pause_key:
-        draw_text_centered("Game Paused", width / 2, height / 2, "white", display_rect=False, font_size=45)
-        pygame.display.update()
-        game_paused_loop()
-
-
-def game_paused_loop():
-    while True:
-        for event in pygame.event.get():
-            quit_program_if_correct_key_pressed_or_screen_exit(event)
-            end_music_if_key_pressed(event)
-            if event.type == pygame.KEYDOWN and event.key == settings.pause_key:
-                return
-
-
 def sign(x):
     if x > 0:
         return 1
@@ -256,7 +855,93 @@ def sign(x):
         return 0
 
 
+def swept_circle_aabb(x, y, dx, dy, radius, left, top, right, bottom):
+    """
+    Returns the fraction of the move by ([dx], [dy]) after which a circle at ([x], [y]) first touches the rectangle,
+    or None if it does not touch it during the move, or already overlaps it at the start.
+    A path that only grazes the rectangle does not count, like touching does not count for Ball.does_collide.
+    """
+
+    # The circle touches the rectangle when its center enters the rectangle grown by [radius], with rounded corners.
+    # First find where the center's path enters the grown rectangle as if it had square corners.
+    enter, leave = -math.inf, math.inf
+    for start, delta, low, high in [(x, dx, left - radius, right + radius), (y, dy, top - radius, bottom + radius)]:
+        if delta == 0:
+            if not low < start < high:
+                return None
+            continue
+        t_low = (low - start) / delta
+        t_high = (high - start) / delta
+        enter = max(enter, min(t_low, t_high))
+        leave = min(leave, max(t_low, t_high))
+
+    if enter >= leave or leave < 0 or enter > 1:
+        return None
+
+    hit_x = x + dx * max(enter, 0)
+    hit_y = y + dy * max(enter, 0)
+    corner_x = left if hit_x < left else right if hit_x > right else None
+    corner_y = top if hit_y < top else bottom if hit_y > bottom else None
+
+    if corner_x is None or corner_y is None:
+        return enter if enter >= 0 else None
+
+    # The path enters next to a corner, where the grown rectangle is rounded, so intersect it with the corner's circle.
+    offset_x = x - corner_x
+    offset_y = y - corner_y
+    a = dx * dx + dy * dy
+    b = 2 * (offset_x * dx + offset_y * dy)
+    c = offset_x * offset_x + offset_y * offset_y - radius * radius
+    discriminant = b * b - 4 * a * c
+    if a == 0 or c <= 0 or discriminant <= 0:
+        return None
+
+    impact = (-b - math.sqrt(discriminant)) / (2 * a)
+    return impact if 0 <= impact <= 1 else None
+
+
+class SpatialHash:
+    """
+    Uniform grid broadphase. Things are put into every [cell_size] square cell their bounding box touches,
+    and only things sharing a cell are returned as pairs that might collide.
+    """
+
+    def __init__(self, *, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, thing, left, top, right, bottom):
+        cell_size = self.cell_size
+        for cell_x in range(int(left // cell_size), int(right // cell_size) + 1):
+            for cell_y in range(int(top // cell_size), int(bottom // cell_size) + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell is None:
+                    self.cells[(cell_x, cell_y)] = [thing]
+                else:
+                    cell.append(thing)
+
+    def pairs(self):
+        """
+        Yields every pair of things sharing at least one cell, once, in the order they were inserted.
+        """
+
+        seen = set()
+        for cell in self.cells.values():
+            for i in range(len(cell)):
+                for j in range(i + 1, len(cell)):
+                    key = (id(cell[i]), id(cell[j]))
+                    if key not in seen:
+                        seen.add(key)
+                        yield cell[i], cell[j]
+
+
 class Paddle:
+    __slots__ = ("score", "x", "y", "width", "height", "acc", "y_vel", "previous_y", "up_key", "down_key", "color",
+                 "border_width")
+
     def __init__(self, *, x, y, paddle_width, paddle_height, speed, up_key, down_key,
                  color=(255, 255, 255), border_width=0):
         self.score = 0
@@ -271,18 +956,22 @@ class Paddle:
 
         self.y_vel = 0
 
+        # Where the paddle was before the last step, for drawing in between steps.
+        self.previous_y = y
+
         self.up_key = up_key
         self.down_key = down_key
 
         self.color = color
         self.border_width = border_width
 
-    def update(self, dt):
-        self.move_on_input(dt)
-        self.draw()
-    
-    def move_on_input(self, dt):
-        keys = pygame.key.get_pressed()
+    def move_on_input(self, dt, keys=None):
+        """
+        [keys] is indexed like pygame.key.get_pressed(), which is used when it is None.
+        """
+
+        if keys is None:
+            keys = pygame.key.get_pressed()
 
         acc = 0
         if keys[self.up_key]:
@@ -293,11 +982,13 @@ class Paddle:
         self.y_vel += acc * dt
         self.y_vel *= 0.08 ** dt
 
+        self.previous_y = self.y
         self.y += self.y_vel * dt
-        
-    def draw(self):
-        pygame.draw.rect(screen, self.color, [self.x_low, self.y_low, self.width, self.height],
-                         self.border_width)
+
+    def draw(self, alpha=1.0):
+        y_low = self.previous_y + (self.y - self.previous_y) * alpha - self.height / 2
+        renderer.mark_dirty(pygame.draw.rect(screen, self.color, [self.x_low, y_low, self.width, self.height],
+                                             self.border_width))
 
     @property
     def x_low(self):
@@ -365,6 +1056,13 @@ class Paddle:
 
 
 class Ball:
+    __slots__ = ("x", "y", "x_value_to_reset_to", "y_value_to_reset_to", "previous_x", "previous_y",
+                 "trail_particle_system", "trail_emitter", "collision_particle_system", "vx", "vy", "radius",
+                 "speed_x", "color", "border_width", "speedup", "time_elapsed")
+
+    # Seconds the ball waits at its starting point before it moves.
+    countdown = 2.5
+
     def __init__(self, *, x, y, radius, speed_x, color=(255, 255, 255), border_width=0, trail, collision, speedup=1.1):
         self.x = x
         self.y = y
@@ -372,7 +1070,12 @@ class Ball:
         self.x_value_to_reset_to = x
         self.y_value_to_reset_to = y
 
+        # Where the ball was before the last step, for drawing in between steps.
+        self.previous_x = x
+        self.previous_y = y
+
         self.trail_particle_system: ParticleSystem = trail
+        self.trail_emitter = TrailEmitter()
 
         self.collision_particle_system: ParticleSystem = collision
 
@@ -388,66 +1091,140 @@ class Ball:
 
         self.time_elapsed = 0
 
-    def update(self, dt, *, paddle_left, paddle_right):
-        self.account_for_paddle_collision(paddle_left, paddle_right)
+    def simulate(self, dt, *, paddle_left, paddle_right, nearby_paddles=None):
+        """
+        Moves the ball by one step and emits its particles, which the owner of the particle systems simulates.
+        Only the paddles in [nearby_paddles] are tested for collisions, both if it is None.
+        """
+
+        self.previous_x, self.previous_y = self.x, self.y
+
+        colliding_left = paddle_left if nearby_paddles is None or paddle_left in nearby_paddles else None
+        colliding_right = paddle_right if nearby_paddles is None or paddle_right in nearby_paddles else None
+
+        self.account_for_paddle_collision(colliding_left, colliding_right)
 
         self.account_for_vertical_screen_collision()
 
         self.account_score_increases(paddle_left, paddle_right)
 
-        self.trail_particle_system.create_trail_particles(pos=(self.x + 2.5, self.y + 2.5))
-        self.trail_particle_system.update(dt)
+        self.trail_particle_system.create_trail_particles(pos=(self.x + 2.5, self.y + 2.5), dt=dt,
+                                                          emitter=self.trail_emitter)
 
-        self.collision_particle_system.update(dt)
-
-        if self.time_elapsed >= 2.5: self.move(dt)
+        if self.in_play: self.move(dt, paddle_left=colliding_left, paddle_right=colliding_right)
         self.time_elapsed += dt
 
-        self.draw()
+    @property
+    def in_play(self):
+        return self.time_elapsed >= self.countdown
 
-    def move(self, dt):
-        self.x += self.vx * dt * (1 + self.time_elapsed / 60)
-        self.y += self.vy * dt * (1 + self.time_elapsed / 60)
+    def move(self, dt, *, paddle_left=None, paddle_right=None):
+        """
+        Moves the ball by one step. If it would hit a paddle on the way, it is moved to the point of impact,
+        bounced there, and moved on for the rest of the step, so it can not pass through a paddle at any speed.
+        """
 
-    def draw(self):
-        pygame.draw.circle(screen, self.color, (self.x, self.y), self.radius, self.border_width)
+        scale = dt * (1 + self.time_elapsed / 60)
+
+        # A ball squeezed between paddles could bounce forever within one step, so the bounces per step are limited.
+        for i in range(3):
+            dx = self.vx * scale
+            dy = self.vy * scale
+
+            first_impact = None
+            for paddle, direction in [(paddle_left, 1), (paddle_right, -1)]:
+                if paddle is None or self.vx * direction > 0:
+                    continue
+                impact = swept_circle_aabb(self.x, self.y, dx, dy, self.radius,
+                                           paddle.x_low, paddle.y_low, paddle.x_high, paddle.y_high)
+                if impact is not None and (first_impact is None or impact < first_impact[0]):
+                    first_impact = (impact, paddle, direction)
+
+            if first_impact is None:
+                self.x += dx
+                self.y += dy
+                return
+
+            impact, paddle, direction = first_impact
+            self.x += dx * impact
+            self.y += dy * impact
+            self.bounce_off(paddle, direction)
+            scale *= 1 - impact
+
+        # Out of bounces, so the rest of the step is moved without testing.
+        # If that ends inside a paddle, the overlap test bounces the ball out on the next step.
+        self.x += self.vx * scale
+        self.y += self.vy * scale
+
+    def draw(self, alpha=1.0):
+        pos = (self.previous_x + (self.x - self.previous_x) * alpha,
+               self.previous_y + (self.y - self.previous_y) * alpha)
+        renderer.mark_dirty(pygame.draw.circle(screen, self.color, pos, self.radius, self.border_width))
 
     def account_for_paddle_collision(self, paddle_left: Paddle, paddle_right: Paddle) -> None:
-        paddle_collided = None
+        """
+        Bounces the ball off a paddle it overlaps, like when a paddle moves into it.
+        A ball already moving away from the paddle is left alone, so it is not bounced twice.
+        """
+
+        for paddle, direction in [(paddle_left, 1), (paddle_right, -1)]:
+            if paddle is not None and self.vx * direction < 0 and self.does_collide(paddle):
+                self.bounce_off(paddle, direction)
 
-        if self.does_collide(paddle_left):
-            self.vx = abs(self.vx)
-            paddle_collided = paddle_left
+    def bounce_off(self, paddle: Paddle, direction):
+        """
+        Sends the ball away from [paddle], in [direction] along x, at an angle set by where on the paddle it hit.
+        """
 
-            paddle_dist = (self.y - paddle_collided.y) * 1/60
-            total_speed = abs(self.vx) + abs(self.vy)
+        paddle_dist = (self.y - paddle.y) * 1/60
+        total_speed = abs(self.vx) + abs(self.vy)
 
-            x_ratio = math.cos(paddle_dist)
-            y_ratio = math.sin(paddle_dist)
+        x_ratio = math.cos(paddle_dist)
+        y_ratio = math.sin(paddle_dist)
 
-            self.vx = abs(x_ratio / (abs(x_ratio) + abs(y_ratio)) * total_speed)
-            self.vy = (y_ratio / (abs(x_ratio) + abs(y_ratio)) * total_speed)
+        self.vx = direction * abs(x_ratio / (abs(x_ratio) + abs(y_ratio)) * total_speed)
+        self.vy = (y_ratio / (abs(x_ratio) + abs(y_ratio)) * total_speed)
 
-            self.vy += paddle_collided.y_vel * 0.5
+        self.vy += paddle.y_vel * 0.5
 
-        if self.does_collide(paddle_right):
-            self.vx = -abs(self.vx)
-            paddle_collided = paddle_right
+        sound.ball_bounce.play()
+        self.collision_particle_system.create_collision_particles(pos=(self.x, self.y))
 
-            paddle_dist = (self.y - paddle_collided.y) * 1/60
-            total_speed = abs(self.vx) + abs(self.vy)
+    def bounce_off_ball(self, other: "Ball"):
+        """
+        If the balls overlap, pushes them apart and, if they are moving towards each other,
+        swaps their speeds along the line between their centers, like two equally heavy balls bouncing.
+        """
 
-            x_ratio = math.cos(paddle_dist)
-            y_ratio = math.sin(paddle_dist)
+        dx = other.x - self.x
+        dy = other.y - self.y
+        distance_squared = dx * dx + dy * dy
+        min_distance = self.radius + other.radius
+        if distance_squared >= min_distance * min_distance or distance_squared == 0:
+            return
 
-            self.vx = -abs(x_ratio / (abs(x_ratio) + abs(y_ratio)) * total_speed)
-            self.vy = (y_ratio / (abs(x_ratio) + abs(y_ratio)) * total_speed)
+        distance = math.sqrt(distance_squared)
+        normal_x = dx / distance
+        normal_y = dy / distance
 
-            self.vy += paddle_collided.y_vel * 0.5
+        push = (min_distance - distance) / 2
+        self.x -= normal_x * push
+        self.y -= normal_y * push
+        other.x += normal_x * push
+        other.y += normal_y * push
 
-        if paddle_collided is not None:
-            sound.ball_bounce.play()
-            self.collision_particle_system.create_collision_particles(pos=(self.x, self.y))
+        approach_speed = (self.vx - other.vx) * normal_x + (self.vy - other.vy) * normal_y
+        if approach_speed <= 0:
+            return
+
+        self.vx -= approach_speed * normal_x
+        self.vy -= approach_speed * normal_y
+        other.vx += approach_speed * normal_x
+        other.vy += approach_speed * normal_y
+
+        sound.ball_bounce.play()
+        self.collision_particle_system.create_collision_particles(pos=(self.x + normal_x * self.radius,
+                                                                       self.y + normal_y * self.radius))
 
     def account_for_vertical_screen_collision(self):
         if self.y_low < 0:
@@ -482,26 +1259,39 @@ class Ball:
         self.vx = -self.vx
         self.vy = random.uniform(self.speed_x / 3, self.speed_x * 2 / 3) * random.choice([-1, 1])
 
-        self.x = self.x_value_to_reset_to
-        self.y = self.y_value_to_reset_to
+        self.x = self.previous_x = self.x_value_to_reset_to
+        self.y = self.previous_y = self.y_value_to_reset_to
 
         self.time_elapsed = 0
+        self.trail_particle_system.restart_trail(self.trail_emitter)
         sound.countdown.play()
 
     def does_collide(self, paddle):
-        for point in self.get_points():
-            if paddle.x_low < point[0] < paddle.x_high and paddle.y_low < point[1] < \
-                    paddle.y_high:
-                return True
-        return False
+        """
+        Whether the ball overlaps [paddle], by the distance from its center to the closest point of the paddle.
+        A ball only touching the paddle does not collide. Reads the plain fields only, so it allocates nothing.
+        """
+
+        x = self.x
+        y = self.y
+        half_width = paddle.width / 2
+        half_height = paddle.height / 2
+
+        closest_x = x
+        if closest_x < paddle.x - half_width:
+            closest_x = paddle.x - half_width
+        elif closest_x > paddle.x + half_width:
+            closest_x = paddle.x + half_width
 
-    def get_points(self):
-        # This does make things scuffed, as circle is essentially treated as a square
+        closest_y = y
+        if closest_y < paddle.y - half_height:
+            closest_y = paddle.y - half_height
+        elif closest_y > paddle.y + half_height:
+            closest_y = paddle.y + half_height
 
-        return [(self.x_low, self.y_low),
-                (self.x_low, self.y_high),
-                (self.x_high, self.y_high),
-                (self.x_high, self.y_low)]
+        dx = x - closest_x
+        dy = y - closest_y
+        return dx * dx + dy * dy < self.radius * self.radius
 
     @property
     def x_low(self):
@@ -568,10 +1358,84 @@ class Ball:
         self.y_high = num
 
 
+class ParticleGovernor:
+    """
+    Measures how long recent frames took to simulate and draw, and scales the particles of every
+    particle system with [quality] to keep them within [target_frame_time].
+    Quality drops quickly when frames are too slow, and climbs back slowly once there is time to spare.
+    """
+
+    def __init__(self, *, target_frame_time=1 / fps, frames_per_check=30, min_quality=0.1, log_changes=False):
+        self.target_frame_time = target_frame_time
+        self.frames_per_check = frames_per_check
+        self.min_quality = min_quality
+        self.log_changes = log_changes
+
+        self.quality = 1.0
+        self.frame_times = []
+
+    def record_frame(self, frame_time):
+        self.frame_times.append(frame_time)
+        if len(self.frame_times) < self.frames_per_check:
+            return
+
+        average_frame_time = sum(self.frame_times) / len(self.frame_times)
+        self.frame_times.clear()
+
+        previous_quality = self.quality
+        if average_frame_time > self.target_frame_time:
+            self.quality = max(self.min_quality, self.quality * self.target_frame_time / average_frame_time * 0.9)
+        elif average_frame_time < self.target_frame_time * 0.7:
+            self.quality = min(1.0, self.quality + 0.05)
+
+        if self.log_changes and self.quality != previous_quality:
+            print(f"{self.describe()} (frames took {average_frame_time * 1000:.1f} ms on average)")
+
+    def describe(self):
+        return f"Particle quality {self.quality:.0%}"
+
+
+particle_governor = ParticleGovernor()
+
+
+class TrailEmitter:
+    """
+    Where a trail was last emitted, and the fraction of a particle it is owed.
+    Each ball has its own, so many balls can leave their trails in one shared particle system.
+    """
+
+    __slots__ = ("last_pos", "credit")
+
+    def __init__(self):
+        self.last_pos = None
+        self.credit = 0
+
+
 class ParticleSystem:
+    """
+    Dead particles are kept in a free list and reused for new ones, so a system that has warmed up
+    does not allocate particles anymore. Once [capacity] particles are alive, [overflow] decides what happens:
+    "grow" allocates more particles anyway, "drop_newest" does not spawn the new particle
+    and "drop_oldest" reuses the oldest live particle for it.
+    """
+
+    overflow_policies = ("grow", "drop_newest", "drop_oldest")
+
     def __init__(self, *, lifetime, vel=(0, 0), start_color, end_color, start_radius, end_radius=0, border_width=0,
-                 particle_count=0, acc=(0, 0), speed=0):
-        self.particles = []
+                 particle_count=0, acc=(0, 0), speed=0, capacity=1024, overflow="grow", preallocate=0,
+                 use_sprites=True, trail_rate=60):
+        if overflow not in self.overflow_policies:
+            raise ValueError(f"overflow must be one of {self.overflow_policies}, not {overflow!r}")
+
+        # Oldest particle first. While [in_spawn_order], the particles also die in this order,
+        # so the dead ones can be taken off the front instead of checking every particle.
+        self.particles = deque()
+        self.free_particles = []
+        self.in_spawn_order = True
+
+        # Particles have their own random numbers, so how many of them are spawned does not change the game itself.
+        self.random = random.Random(random.random())
+
         self.lifetime = lifetime
         self.vel = vel
         self.start_color = start_color
@@ -583,93 +1447,585 @@ class ParticleSystem:
         self.acc = acc
         self.speed = speed
 
+        self.ramp = ParticleRamp(lifetime=lifetime, start_color=start_color, end_color=end_color,
+                                 start_radius=start_radius, end_radius=end_radius)
+
+        # Draw the whole system with one blits call from a sprite atlas, instead of one draw.circle per particle.
+        self.use_sprites = use_sprites
+        self.sprites = None
+
+        self.capacity = capacity
+        self.overflow = overflow
+
+        # Counters, to check that frames after warming up allocate nothing.
+        self.allocated = 0
+        self.recycled = 0
+        self.dropped = 0
+
+        # Trail particles per second, independent of the framerate.
+        self.trail_rate = trail_rate
+        self.trail_emitter = TrailEmitter()
+
+        self.preallocate(preallocate)
+
+    def __len__(self):
+        return len(self.particles)
+
+    def preallocate(self, count):
+        for i in range(count):
+            self.free_particles.append(self.new_particle(pos=(0, 0), vel=(0, 0)))
+
+    def new_particle(self, *, pos, vel, acc=(0, 0)):
+        self.allocated += 1
+        return Particle(pos=pos, lifetime=self.lifetime, vel=vel, acc=acc, start_color=self.start_color,
+                        end_color=self.end_color, start_radius=self.start_radius, end_radius=self.end_radius,
+                        border_width=self.border_width, ramp=self.ramp)
+
+    def has_room(self):
+        """
+        Applies the overflow policy before spawning. Returns False if the new particle should be dropped.
+        While the governor has lowered the quality, "grow" stops growing and drops the newest particles.
+        """
+
+        if len(self) < self.capacity * particle_governor.quality:
+            return True
+        if self.overflow == "grow" and particle_governor.quality >= 1:
+            return True
+
+        self.dropped += 1
+        if self.overflow == "drop_oldest" and len(self) > 0:
+            self.remove_oldest()
+            return True
+        return False
+
+    def remove_oldest(self):
+        if not self.in_spawn_order:
+            # The head is only the particle closest to dying while they die in order, so restore that order first.
+            ordered = sorted(self.particles, key=lambda particle: particle.lifetime)
+            self.particles.clear()
+            self.particles.extend(ordered)
+            self.in_spawn_order = True
+        self.free_particles.append(self.particles.popleft())
+
+    def spawn(self, *, pos, vel, acc=(0, 0), age=0):
+        if not self.has_room():
+            return
+
+        if self.particles and self.lifetime - age < self.particles[-1].lifetime:
+            # Would die before an older particle, so death order no longer follows spawn order.
+            self.in_spawn_order = False
+
+        if not self.free_particles:
+            particle = self.new_particle(pos=pos, vel=vel, acc=acc)
+            particle.lifetime -= age
+            self.particles.append(particle)
+            return
+
+        particle = self.free_particles.pop()
+        particle.reset(pos=pos, lifetime=self.lifetime - age, vel=vel, acc=acc, ramp=self.ramp,
+                       border_width=self.border_width)
+        self.particles.append(particle)
+        self.recycled += 1
+
     def update(self, dt):
+        """
+        Simulates the particles, then draws them onto the screen if rendering is on.
+        """
+
+        self.simulate(dt)
+        if settings.render:
+            self.render(screen)
+
+    def simulate(self, dt):
         for particle in self.particles:
             particle.update(dt)
         self.remove_dead_particles()
 
-    def remove_dead_particles(self):
-        alive_particles = []
+    def get_sprites(self):
+        if self.sprites is None:
+            self.sprites = ParticleSprites(self.ramp, border_width=self.border_width)
+        return self.sprites
+
+    def render(self, surface, alpha=1.0):
+        """
+        Draws the particles [alpha] of the way from where they were before the last simulate step,
+        to where they are now. Rendering does not change the particles.
+        """
+
+        if not self.use_sprites:
+            for particle in self.particles:
+                particle.draw(surface, alpha)
+            return
+
+        sprites = self.get_sprites()
+        atlas, areas, offsets = sprites.surface, sprites.areas, sprites.offsets
+
+        blit_sequence = []
         for particle in self.particles:
-            if particle.is_alive():
-                alive_particles.append(particle)
-        self.particles = alive_particles
-
-    def create_trail_particles(self, *, pos):
-        #make framerate independent
-        #make framerate independent
-        #make framerate independent
-        #make framerate independent
-        #make framerate independent
-        self.particles.append(Particle(pos=pos, lifetime=self.lifetime, vel=self.vel, start_color=self.start_color,
-                                       end_color=self.end_color,
-                                       start_radius=self.start_radius, end_radius=self.end_radius,
-                                       border_width=self.border_width))
+            x, y = particle.interpolated_pos(alpha)
+            i = particle.ramp_index
+            blit_sequence.append((atlas, (x - offsets[i], y - offsets[i]), areas[i]))
+
+        dirty_rects = surface.blits(blit_sequence)
+        renderer.mark_dirty_rects(dirty_rects)
+
+    def remove_dead_particles(self):
+        particles = self.particles
+
+        if self.in_spawn_order:
+            while particles and not particles[0].is_alive():
+                self.free_particles.append(particles.popleft())
+        else:
+            # Mixed lifetimes, so every particle has to be checked. Rotates the live ones back onto the queue in order,
+            # and checks whether the ones left die in order again.
+            in_order = True
+            previous_lifetime = 0
+            for i in range(len(particles)):
+                particle = particles.popleft()
+                if particle.is_alive():
+                    particles.append(particle)
+                    in_order = in_order and particle.lifetime >= previous_lifetime
+                    previous_lifetime = particle.lifetime
+                else:
+                    self.free_particles.append(particle)
+            self.in_spawn_order = in_order
+
+    def create_trail_particles(self, *, pos, dt, emitter: TrailEmitter = None):
+        """
+        Emits [trail_rate] particles per second, spread evenly along the path from the last position to [pos],
+        and aged by how long ago in the frame they would have been emitted. So the trail looks the same,
+        and has the same number of particles, at any framerate.
+        [emitter] holds the state of the trail, the system's own one is used when it is None.
+        """
+
+        if emitter is None:
+            emitter = self.trail_emitter
+
+        last_pos = emitter.last_pos if emitter.last_pos is not None else pos
+        emitter.last_pos = pos
+
+        emitter.credit += self.trail_rate * dt * particle_governor.quality
+        emit_count = int(emitter.credit)
+        emitter.credit -= emit_count
+
+        for i in range(1, emit_count + 1):
+            progress = i / emit_count
+            self.spawn(pos=(last_pos[0] + (pos[0] - last_pos[0]) * progress,
+                            last_pos[1] + (pos[1] - last_pos[1]) * progress),
+                       vel=self.vel, age=(1 - progress) * dt)
+
+    def restart_trail(self, emitter: TrailEmitter = None):
+        """
+        Starts the next trail particles from scratch, e.g. after the ball jumped back to the center.
+        """
+
+        (emitter if emitter is not None else self.trail_emitter).last_pos = None
 
     def create_collision_particles(self, *, pos):
         # Later on, we will create a menu system that you can add these particle settings to.
 
-        for i in range(0, self.particle_count):
+        for i in range(0, round(self.particle_count * particle_governor.quality)):
             # finds a random point on a circle around the point of collision
-            angle = random.random() * math.tau
+            angle = self.random.random() * math.tau
             random_vel = (math.cos(angle) * self.speed, math.sin(angle) * self.speed)
 
-            self.particles.append(
-                Particle(pos=pos, lifetime=self.lifetime, vel=random_vel, acc=self.acc, start_color=self.start_color,
-                         end_color=self.end_color, start_radius=self.start_radius, end_radius=self.end_radius,
-                         border_width=self.border_width))
+            self.spawn(pos=pos, vel=random_vel, acc=self.acc)
 
     def create_background_particles(self, dt):
-        i = self.particle_count * dt
+        i = self.particle_count * dt * particle_governor.quality
         while i > 0:
-            if i >= 1 or (i < 1 and random.random() <= i):
-                random_pos = (random.randint(0, width), random.randint(0, height))
-                self.particles.append(
-                Particle(pos=random_pos, lifetime=self.lifetime, vel=self.vel, start_color=self.start_color,
-                         end_color=self.end_color,
-                         start_radius=self.start_radius, end_radius=self.end_radius, border_width=self.border_width))
+            if i >= 1 or (i < 1 and self.random.random() <= i):
+                random_pos = (self.random.randint(0, width), self.random.randint(0, height))
+                self.spawn(pos=random_pos, vel=self.vel)
             i -= 1
 
 
+class NumpyParticleSystem(ParticleSystem):
+    """
+    Same as ParticleSystem, but the particles are stored as rows of NumPy arrays, which are updated
+    all at once every frame instead of one Particle object at a time.
+    The live particles are the rows from [start] to [end], oldest first.
+    """
+
+    def __init__(self, *, lifetime, vel=(0, 0), start_color, end_color, start_radius, end_radius=0, border_width=0,
+                 particle_count=0, acc=(0, 0), speed=0, capacity=1024, overflow="grow", preallocate=64,
+                 use_sprites=True, trail_rate=60):
+        if np is None:
+            raise ImportError("NumpyParticleSystem needs numpy to be installed")
+
+        self.start = 0
+        self.end = 0
+        self.positions = np.zeros((0, 2))
+        self.previous_positions = np.zeros((0, 2))
+        self.velocities = np.zeros((0, 2))
+        self.accelerations = np.zeros((0, 2))
+        self.colors = np.zeros((0, 3))
+        self.radii = np.zeros(0)
+        self.lifetimes = np.zeros(0)
+        self.ramp_indices = np.zeros(0, dtype=int)
+
+        super().__init__(lifetime=lifetime, vel=vel, start_color=start_color, end_color=end_color,
+                         start_radius=start_radius, end_radius=end_radius, border_width=border_width,
+                         particle_count=particle_count, acc=acc, speed=speed, capacity=capacity, overflow=overflow,
+                         preallocate=max(preallocate, 1), use_sprites=use_sprites, trail_rate=trail_rate)
+
+        self.ramp_colors = np.array(self.ramp.colors, dtype=float)
+        self.ramp_radii = np.array(self.ramp.radii)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def arrays(self):
+        return [self.positions, self.previous_positions, self.velocities, self.accelerations, self.colors, self.radii,
+                self.lifetimes, self.ramp_indices]
+
+    def preallocate(self, count):
+        # Rows past [end] are the free slots.
+        (self.positions, self.previous_positions, self.velocities, self.accelerations, self.colors, self.radii,
+         self.lifetimes, self.ramp_indices) = [
+            np.concatenate([array, np.zeros((count,) + array.shape[1:], dtype=array.dtype)])
+            for array in self.arrays()]
+        self.allocated += count
+
+    def move_to_front(self):
+        """
+        Moves the live rows to the start of the arrays, freeing up the rows of the particles that died before them.
+        """
+
+        live_count = len(self)
+        for array in self.arrays():
+            array[:live_count] = array[self.start:self.end]
+        self.start, self.end = 0, live_count
+
+    def remove_oldest(self):
+        if not self.in_spawn_order:
+            live = slice(self.start, self.end)
+            order = np.argsort(self.lifetimes[live], kind="stable")
+            for array in self.arrays():
+                array[live] = array[live][order]
+            self.in_spawn_order = True
+        self.start += 1
+
+    def spawn(self, *, pos, vel, acc=(0, 0), age=0):
+        if not self.has_room():
+            return
+
+        if self.end < len(self.lifetimes):
+            self.recycled += 1
+        elif self.start > 0:
+            self.move_to_front()
+            self.recycled += 1
+        else:
+            self.preallocate(len(self.lifetimes))
+
+        if self.end > self.start and self.lifetime - age < self.lifetimes[self.end - 1]:
+            self.in_spawn_order = False
+
+        i = self.end
+        self.positions[i] = pos
+        self.previous_positions[i] = pos
+        self.velocities[i] = vel
+        self.accelerations[i] = acc
+        self.colors[i] = self.start_color
+        self.radii[i] = self.start_radius
+        self.lifetimes[i] = self.lifetime - age
+        self.ramp_indices[i] = 0
+        self.end += 1
+
+    def simulate(self, dt):
+        live = slice(self.start, self.end)
+
+        # Same steps, in the same order, as Particle.update
+        self.previous_positions[live] = self.positions[live]
+        self.positions[live] += self.velocities[live] * dt
+        self.velocities[live] += self.accelerations[live] * dt
+
+        self.lifetimes[live] -= dt
+
+        ramp_indices = self.ramp_indices[live]
+        ramp_indices[:] = (self.lifetime - self.lifetimes[live]) * self.ramp.steps_per_second + 0.5
+        np.minimum(ramp_indices, self.ramp.steps - 1, out=ramp_indices)
+        self.radii[live] = self.ramp_radii[ramp_indices]
+        self.colors[live] = self.ramp_colors[ramp_indices]
+
+        self.remove_dead_particles()
+
+    def render(self, surface, alpha=1.0):
+        live = slice(self.start, self.end)
+
+        positions = self.positions[live]
+        if alpha != 1:
+            previous_positions = self.previous_positions[live]
+            positions = previous_positions + (positions - previous_positions) * alpha
+
+        if not self.use_sprites:
+            for pos, color, radius in zip(positions.tolist(), self.colors[live].tolist(),
+                                          self.radii[live].tolist()):
+                renderer.mark_dirty(pygame.draw.circle(surface, color, pos, radius, self.border_width))
+            return
+
+        sprites = self.get_sprites()
+        atlas, areas = sprites.surface, sprites.areas
+
+        ramp_indices = self.ramp_indices[live]
+        corners = positions - sprites.offset_array[ramp_indices, np.newaxis]
+
+        dirty_rects = surface.blits([(atlas, corner, areas[i])
+                                     for corner, i in zip(corners.tolist(), ramp_indices.tolist())])
+        renderer.mark_dirty_rects(dirty_rects)
+
+    def remove_dead_particles(self):
+        live = slice(self.start, self.end)
+
+        if self.in_spawn_order:
+            # The remaining lifetimes go up from the oldest particle, so the dead ones are all at the front.
+            self.start += int(np.searchsorted(self.lifetimes[live], 0, side="right"))
+        else:
+            alive = self.lifetimes[live] > 0
+            alive_count = int(np.count_nonzero(alive))
+            if alive_count < len(self):
+                for array in self.arrays():
+                    array[:alive_count] = array[live][alive]
+                self.start, self.end = 0, alive_count
+            self.in_spawn_order = bool(np.all(np.diff(self.lifetimes[self.start:self.end]) >= 0))
+
+        if self.start == self.end:
+            self.start = self.end = 0
+
+
+class AnalyticParticleSystem(ParticleSystem):
+    """
+    Particles move with a constant acceleration, and their color and radius only depend on their age, so
+    where a particle is can be worked out straight from when and where it was spawned, without stepping it.
+    Each particle is only (spawn time, x, y, x velocity, y velocity, x acceleration, y acceleration),
+    and [time] is the clock of the system. Drawing at any other time, e.g. to seek or rewind, is just as cheap.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.time = 0
+        self.previous_time = 0
+
+    def preallocate(self, count):
+        # Particles are plain tuples, there is nothing to keep around and reuse.
+        pass
+
+    def remove_oldest(self):
+        if not self.in_spawn_order:
+            self.particles = deque(sorted(self.particles))
+            self.in_spawn_order = True
+        self.particles.popleft()
+
+    def spawn(self, *, pos, vel, acc=(0, 0), age=0):
+        if not self.has_room():
+            return
+
+        spawn_time = self.time - age
+        if self.particles and spawn_time < self.particles[-1][0]:
+            self.in_spawn_order = False
+
+        self.particles.append((spawn_time, pos[0], pos[1], vel[0], vel[1], acc[0], acc[1]))
+        self.allocated += 1
+
+    def evaluate(self, particle, time):
+        """
+        Returns (x, y, ramp index) of the particle at [time].
+        """
+
+        spawn_time, x, y, vx, vy, ax, ay = particle
+        age = time - spawn_time
+        return (x + vx * age + ax * age * age / 2, y + vy * age + ay * age * age / 2,
+                self.ramp.index(self.lifetime - age))
+
+    def simulate(self, dt):
+        self.previous_time = self.time
+        self.time += dt
+        self.remove_dead_particles()
+
+    def seek(self, time):
+        """
+        Moves the system's clock to [time]. Particles that are dead by then are removed,
+        particles that have not been spawned yet are kept but not drawn.
+        """
+
+        self.previous_time = self.time = time
+        self.remove_dead_particles()
+
+    def render(self, surface, alpha=1.0, time=None):
+        """
+        Draws the particles at [time], or [alpha] of the way through the last simulate step if no time is given.
+        """
+
+        if time is None:
+            time = self.previous_time + (self.time - self.previous_time) * alpha
+        states = [self.evaluate(particle, time) for particle in self.particles if particle[0] <= time]
+
+        if not self.use_sprites:
+            colors, radii = self.ramp.colors, self.ramp.radii
+            for x, y, i in states:
+                renderer.mark_dirty(pygame.draw.circle(surface, colors[i], (x, y), radii[i], self.border_width))
+            return
+
+        sprites = self.get_sprites()
+        atlas, areas, offsets = sprites.surface, sprites.areas, sprites.offsets
+
+        dirty_rects = surface.blits([(atlas, (x - offsets[i], y - offsets[i]), areas[i]) for x, y, i in states])
+        renderer.mark_dirty_rects(dirty_rects)
+
+    def remove_dead_particles(self):
+        particles = self.particles
+        dead_before = self.time - self.lifetime
+
+        if self.in_spawn_order:
+            while particles and particles[0][0] <= dead_before:
+                particles.popleft()
+        else:
+            self.particles = deque(sorted(particle for particle in particles if particle[0] > dead_before))
+            self.in_spawn_order = True
+
+
+particle_backends = {"python": ParticleSystem, "numpy": NumpyParticleSystem, "analytic": AnalyticParticleSystem}
+
+
+def new_particle_system(**kwargs) -> ParticleSystem:
+    """
+    Creates a particle system with the backend picked in the settings.
+    """
+
+    return particle_backends[settings.particle_backend](**kwargs)
+
+
+class ParticleRamp:
+    """
+    The color and radius of a particle only depend on its age. So they are worked out once per particle system
+    for [steps] evenly spaced ages, and particles look them up instead of changing their color every frame.
+    """
+
+    def __init__(self, *, lifetime, start_color, end_color, start_radius, end_radius=0, steps=256):
+        self.lifetime = lifetime
+        self.steps = steps
+        self.steps_per_second = (steps - 1) / lifetime
+
+        self.colors = []
+        self.radii = []
+        for i in range(steps):
+            progress = i / (steps - 1)
+            self.colors.append(tuple(round(min(max(start + (end - start) * progress, 0), 255))
+                                     for start, end in zip(start_color, end_color)))
+            self.radii.append(max(start_radius + (end_radius - start_radius) * progress, 0))
+
+    def index(self, remaining_lifetime):
+        i = int((self.lifetime - remaining_lifetime) * self.steps_per_second + 0.5)
+        return i if i < self.steps else self.steps - 1
+
+
+class ParticleSprites:
+    """
+    A sprite atlas: every step of a ParticleRamp drawn as a circle, next to each other on one surface.
+    [border_width] 0 gives filled circles, anything else the bordered ones.
+    """
+
+    def __init__(self, ramp: ParticleRamp, *, border_width=0):
+        self.border_width = border_width
+
+        sizes = [math.ceil(radius) * 2 + 2 for radius in ramp.radii]
+
+        # A color key blits a lot faster than per pixel alpha. Pick one that none of the circles use.
+        color_key = (255, 0, 255)
+        while color_key in ramp.colors:
+            color_key = (color_key[0] - 1, 0, color_key[2])
+
+        self.surface = pygame.Surface((sum(sizes), max(sizes)))
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        self.surface.fill(color_key)
+        self.surface.set_colorkey(color_key)
+
+        # Area of each step on the atlas, and how far the top left of that area is from the circle's center.
+        self.areas = []
+        self.offsets = []
+
+        x = 0
+        for color, radius, size in zip(ramp.colors, ramp.radii, sizes):
+            pygame.draw.circle(self.surface, color, (x + size / 2, size / 2), radius, border_width)
+            self.areas.append(pygame.Rect(x, 0, size, size))
+            self.offsets.append(size / 2)
+            x += size
+
+        self.offset_array = np.array(self.offsets) if np is not None else None
+
 
 class Particle:
+    __slots__ = ("pos", "previous_pos", "vel", "acc", "ramp", "ramp_index", "color", "radius", "border_width",
+                 "lifetime")
+
     def __init__(self, *, lifetime, pos, vel, acc=(0, 0), start_color, end_color, start_radius, end_radius=0,
-                 border_width=0):
+                 border_width=0, ramp: ParticleRamp = None):
         self.pos = pygame.Vector2(pos)
+        self.previous_pos = pygame.Vector2(pos)
         self.vel = pygame.Vector2(vel)
         self.acc = pygame.Vector2(acc)
 
-        self.color = Color(start_color)
-        self.color_change = (Color(end_color) - Color(start_color)) / lifetime
+        # Particle systems share one ramp between all their particles.
+        if ramp is None:
+            ramp = ParticleRamp(lifetime=lifetime, start_color=start_color, end_color=end_color,
+                                start_radius=start_radius, end_radius=end_radius)
+        self.ramp = ramp
 
-        self.radius = start_radius
-        self.radius_change = (end_radius - start_radius) / lifetime
+        self.ramp_index = 0
+        self.color = ramp.colors[0]
+        self.radius = ramp.radii[0]
+
+        self.border_width = border_width
+        self.lifetime = lifetime
+
+    def reset(self, *, lifetime, pos, vel, acc=(0, 0), ramp: ParticleRamp, border_width=0):
+        """
+        Turns this particle into a new one, updating the vectors in place instead of creating new ones.
+        """
+
+        self.pos.update(pos)
+        self.previous_pos.update(pos)
+        self.vel.update(vel)
+        self.acc.update(acc)
+
+        self.ramp = ramp
+        self.ramp_index = 0
+        self.color = ramp.colors[0]
+        self.radius = ramp.radii[0]
 
         self.border_width = border_width
         self.lifetime = lifetime
 
     def update(self, dt):
+        """
+        Particles are drawn by their particle system, after all of them have been updated.
+        """
+
         self.move(dt)
-        self.shrink(dt)
-        self.fade(dt)
-        self.draw()
         self.update_time(dt)
+        self.ramp_index = self.ramp.index(self.lifetime)
+        self.shrink()
+        self.fade()
 
     def move(self, dt):
+        self.previous_pos.update(self.pos)
         self.pos += self.vel * dt
         self.vel += self.acc * dt
 
-    def draw(self):
-        pygame.draw.circle(screen, self.color, self.pos, self.radius, self.border_width)
+    def interpolated_pos(self, alpha):
+        previous_pos, pos = self.previous_pos, self.pos
+        return previous_pos.x + (pos.x - previous_pos.x) * alpha, previous_pos.y + (pos.y - previous_pos.y) * alpha
+
+    def draw(self, surface, alpha=1.0):
+        renderer.mark_dirty(pygame.draw.circle(surface, self.color, self.interpolated_pos(alpha), self.radius,
+                                               self.border_width))
 
-    def shrink(self, dt):
-        self.radius += self.radius_change * dt
-        if self.radius < 0:
-            self.radius = 0
+    def shrink(self):
+        self.radius = self.ramp.radii[self.ramp_index]
 
-    def fade(self, dt):
-        self.color += self.color_change * dt
-        self.color.keep_within_bounds()
+    def fade(self):
+        self.color = self.ramp.colors[self.ramp_index]
 
     def update_time(self, dt):
         self.lifetime -= dt
@@ -683,6 +2039,8 @@ class Color:
     We can change this to be easier once we use inheritance.
     """
 
+    __slots__ = ("vec",)
+
     def __init__(self, col):
         self.vec = pygame.Vector3(col)
 
@@ -749,4 +2107,75 @@ class Color:
         self.vec[2] = num
 
 
-menu_loop(score_required_to_win=2)
+def setup():
+    """
+    Opens the window, and starts loading the fonts and sounds.
+    """
+
+    global screen, sound
+
+    pygame.init()
+    pygame.display.set_caption('Pong')
+
+    screen = pygame.display.set_mode((width, height))
+
+    fonts.prewarm([45, 72])
+
+    sound = Sound(ball_bounce="resources/ball_bounce.wav", score_point="resources/score_point.wav",
+                  score_point_volume=0.1, game_start="resources/game_start.wav", countdown="resources/countdown.wav",
+                  game_over="resources/game_over.wav", music="resources/music.wav", loader=asset_loader)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    seed = int(argv[argv.index("--seed") + 1]) if "--seed" in argv else None
+
+    if "--particles" in argv:
+        settings.particle_backend = argv[argv.index("--particles") + 1]
+        if settings.particle_backend not in particle_backends:
+            sys.exit(f"--particles must be one of {', '.join(particle_backends)}, not {settings.particle_backend!r}")
+        if settings.particle_backend == "numpy" and np is None:
+            sys.exit("--particles numpy needs numpy, which is not installed")
+
+    if "--balls" in argv:
+        settings.ball_count = int(argv[argv.index("--balls") + 1])
+        try:
+            check_ball_count(settings.ball_count)
+        except ValueError as error:
+            sys.exit(f"--balls: {error}")
+
+    if "--headless" in argv:
+        score_1, score_2, frames, frames_per_second = run_headless(seed=seed)
+        print(f"Headless: {score_1} - {score_2} after {frames} frames, "
+              f"{frames_per_second:.0f} simulated frames per second")
+        return
+
+    if seed is not None:
+        random.seed(seed)
+
+    renderer.enabled = "--dirty-rects" in argv
+
+    settings.show_particle_quality = "--particle-quality" in argv
+    particle_governor.log_changes = settings.show_particle_quality
+
+    setup()
+
+    if "--import-timing" in argv:
+        print(f"Importing took {import_seconds * 1000:.1f} ms")
+
+    if "--font-timing" in argv:
+        eager_seconds, lazy_seconds = measure_font_cold_start()
+        print(f"Font cold start: eager 300 fonts {eager_seconds * 1000:.1f} ms, on demand {lazy_seconds * 1000:.1f} ms")
+
+    if "--asset-timing" in argv:
+        asset_loader.wait()
+        asset_loader.report()
+
+    run_scenes(MenuScene(score_required_to_win=2, controller=follow_ball_controller if "--bot" in argv else None))
+
+
+import_seconds = time.perf_counter() - import_start_time
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The tests never open a real window or play sound.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+@pytest.fixture
+def game_window():
+    """
+    Opens the game window with [current_code.setup], and puts back the screen and sounds it replaced afterwards.
+    """
+
+    import current_code
+
+    previous_screen, previous_sound = current_code.screen, current_code.sound
+    current_code.setup()
+    current_code.asset_loader.wait()
+    try:
+        yield current_code.screen
+    finally:
+        current_code.screen, current_code.sound = previous_screen, previous_sound
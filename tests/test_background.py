@@ -0,0 +1,15 @@
+import pygame
+
+import current_code
+
+
+def test_background_layer_follows_background_color(monkeypatch):
+    background_layer = current_code.BackgroundLayer()
+    surface = pygame.Surface((100, 100))
+
+    background_layer.draw(surface)
+    assert surface.get_at((0, 0))[:3] == current_code.background_color
+
+    monkeypatch.setattr(current_code, "background_color", (10, 20, 30))
+    background_layer.draw(surface)
+    assert surface.get_at((0, 0))[:3] == (10, 20, 30)
@@ -0,0 +1,132 @@
+import pygame
+import pytest
+
+import current_code
+from current_code import swept_circle_aabb
+
+
+@pytest.fixture
+def paddle():
+    # Spans x 47.5 to 52.5 and y 220 to 280.
+    return current_code.Paddle(x=50, y=250, paddle_width=5, paddle_height=60, speed=500,
+                               up_key=pygame.K_w, down_key=pygame.K_s)
+
+
+def new_ball(x=0, y=0):
+    particles = current_code.new_particle_system(lifetime=1, start_color=(255, 255, 255), end_color=(0, 0, 0),
+                                                 start_radius=2)
+    return current_code.Ball(x=x, y=y, radius=10, speed_x=200, trail=particles, collision=particles)
+
+
+@pytest.fixture
+def ball():
+    return new_ball()
+
+
+@pytest.mark.parametrize("pos, collides", [
+    ((300, 300), False),
+    # Inside the square around the ball, but farther than the radius from the corner.
+    ((60.5, 212), False),
+    ((58.5, 214), True),
+    ((62.5, 250), False),
+    ((60, 250), True),
+    ((50, 250), True),
+], ids=["far away", "corner miss", "corner overlap", "touching a side", "overlapping a side", "center inside"])
+def test_does_collide(ball, paddle, pos, collides):
+    ball.x, ball.y = pos
+    assert ball.does_collide(paddle) is collides
+
+
+# The rectangle of the paddle fixture, as (left, top, right, bottom).
+paddle_rect = (47.5, 220, 52.5, 280)
+
+
+def test_swept_head_on_hit():
+    assert swept_circle_aabb(100, 250, -100, 0, 10, *paddle_rect) == pytest.approx(0.375)
+
+
+def test_swept_corner_hit():
+    # Reaches the circle of radius 10 around the corner (52.5, 220) at x = 58.5.
+    assert swept_circle_aabb(100, 212, -100, 0, 10, *paddle_rect) == pytest.approx(0.415)
+
+
+def test_swept_corner_miss():
+    # Passes through the grown rectangle's corner square, but outside the rounded corner.
+    assert swept_circle_aabb(100, 205, -100, 0, 10, *paddle_rect) is None
+
+
+def test_swept_moving_away():
+    assert swept_circle_aabb(100, 250, 100, 0, 10, *paddle_rect) is None
+
+
+def test_swept_already_overlapping():
+    assert swept_circle_aabb(55, 250, -10, 0, 10, *paddle_rect) is None
+
+
+@pytest.mark.parametrize("pos", [(100, 250), (55, 250), (60, 210)], ids=["away", "overlapping", "near a corner"])
+def test_swept_not_moving(pos):
+    assert swept_circle_aabb(*pos, 0, 0, 10, *paddle_rect) is None
+
+
+@pytest.mark.parametrize("path", [(0, -40, 100, 0), (65, 100, 0, -200)], ids=["past a corner", "along a side"])
+def test_swept_graze_is_not_a_hit(path):
+    assert swept_circle_aabb(*path, 10, 50, -30, 55, 30) is None
+
+
+def test_move_keeps_the_rest_of_the_step_after_the_last_bounce(ball, monkeypatch):
+    # Every test hits straight away, so all bounces are used up without moving the ball.
+    monkeypatch.setattr(current_code, "swept_circle_aabb", lambda *args: 0)
+    monkeypatch.setattr(current_code.Ball, "bounce_off", lambda self, paddle, direction: None)
+    left = current_code.Paddle(x=50, y=250, paddle_width=5, paddle_height=60, speed=500, up_key=0, down_key=1)
+
+    ball.x, ball.y, ball.vx, ball.vy, ball.time_elapsed = 100, 250, -60, 0, 0
+    ball.move(1, paddle_left=left)
+    assert ball.x == pytest.approx(40)
+
+
+@pytest.mark.parametrize("nearby, bounces", [("all", True), ("left", True), ("none", False)])
+def test_simulate_only_tests_nearby_paddles(ball, paddle, nearby, bounces):
+    right = current_code.Paddle(x=750, y=250, paddle_width=5, paddle_height=60, speed=500, up_key=0, down_key=1)
+    nearby_paddles = {"all": None, "left": [paddle], "none": []}[nearby]
+
+    # Heading straight into the left paddle, which it reaches within the step.
+    ball.x, ball.y, ball.vx, ball.vy, ball.time_elapsed = 65, 250, -200, 0, ball.countdown
+    ball.simulate(0.1, paddle_left=paddle, paddle_right=right, nearby_paddles=nearby_paddles)
+    if bounces:
+        assert ball.vx > 0 and ball.x >= 62.5
+    else:
+        assert ball.vx == -200 and ball.x < 50
+
+
+def test_overlapping_balls_moving_together_bounce():
+    a, b = new_ball(100, 100), new_ball(115, 100)
+    a.vx, a.vy, b.vx, b.vy = 50, 10, -30, 20
+
+    a.bounce_off_ball(b)
+    assert b.x - a.x == pytest.approx(20)
+    assert (a.vx, a.vy, b.vx, b.vy) == pytest.approx((-30, 10, 50, 20))
+
+
+def test_overlapping_balls_moving_apart_keep_their_speed():
+    a, b = new_ball(100, 100), new_ball(115, 100)
+    a.vx, a.vy, b.vx, b.vy = -50, 10, 30, 20
+
+    a.bounce_off_ball(b)
+    assert b.x - a.x == pytest.approx(20)
+    assert (a.vx, a.vy, b.vx, b.vy) == (-50, 10, 30, 20)
+
+
+def test_spatial_hash_pairs_things_sharing_cells_once():
+    grid = current_code.SpatialHash(cell_size=10)
+    # Both boxes cover the same four cells.
+    grid.insert("a", 2, 2, 18, 18)
+    grid.insert("b", 5, 5, 15, 15)
+    assert list(grid.pairs()) == [("a", "b")]
+
+
+def test_spatial_hash_does_not_pair_far_apart_things():
+    grid = current_code.SpatialHash(cell_size=10)
+    grid.insert("a", 2, 2, 8, 8)
+    grid.insert("b", 52, 2, 58, 8)
+    grid.insert("c", 2, 52, 8, 58)
+    assert list(grid.pairs()) == []
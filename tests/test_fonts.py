@@ -0,0 +1,53 @@
+import threading
+
+import pygame
+
+from current_code import FontCache, TextCache
+
+
+def test_font_cache_from_several_threads():
+    pygame.font.init()
+    font_cache = FontCache(max_fonts=3)
+
+    fonts = {}
+
+    def load(font_size):
+        fonts.setdefault(font_size, []).append(font_cache.get(font_size))
+
+    threads = [threading.Thread(target=load, args=(font_size,)) for font_size in [10, 20, 10, 30, 20, 10]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(font_cache.fonts) == [10, 20, 30]
+    # Every thread asking for a size got the same font.
+    for font_size, loaded in fonts.items():
+        assert all(font is font_cache.fonts[font_size] for font in loaded)
+
+
+def test_text_cache_counts_hits_and_misses():
+    pygame.font.init()
+    text_cache = TextCache(FontCache())
+
+    first_surface, first_rect = text_cache.render("Pong", 20, "white")
+    assert (text_cache.hits, text_cache.misses) == (0, 1)
+
+    first_rect.move_ip(100, 100)
+    surface, rect = text_cache.render("Pong", 20, "white")
+    assert (text_cache.hits, text_cache.misses) == (1, 1)
+    assert surface is first_surface
+    # Moving the first rect did not move the cached one.
+    assert rect.topleft == (0, 0)
+
+
+def test_text_cache_drops_the_least_recently_used_surface():
+    pygame.font.init()
+    text_cache = TextCache(FontCache(), max_surfaces=2)
+
+    text_cache.render("a", 20, "white")
+    text_cache.render("b", 20, "white")
+    text_cache.render("a", 20, "white")
+    text_cache.render("c", 20, "white")
+
+    assert [key[0] for key in text_cache.surfaces] == ["a", "c"]
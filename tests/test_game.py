@@ -0,0 +1,10 @@
+import pytest
+
+import current_code
+
+
+@pytest.mark.parametrize("ball_count", [0, -3])
+def test_game_needs_at_least_one_ball(monkeypatch, ball_count):
+    monkeypatch.setattr(current_code.settings, "ball_count", ball_count)
+    with pytest.raises(ValueError):
+        current_code.GameScene(2)
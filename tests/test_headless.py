@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+import current_code
+
+
+class StepClock:
+    """
+    Stands in for [current_code.clock]: never sleeps, and reports one physics step per frame,
+    so the rendered match runs as fast as it draws instead of in real time.
+    """
+
+    def tick(self, framerate=0):
+        return current_code.physics_dt * 1000
+
+
+backends = sorted(backend for backend in current_code.particle_backends
+                  if backend != "numpy" or current_code.np is not None)
+
+
+@pytest.mark.parametrize("ball_count", [1, 3])
+@pytest.mark.parametrize("particle_backend", backends)
+@pytest.mark.parametrize("seed", [1, 2])
+def test_headless_scores_match_rendered_run(game_window, monkeypatch, seed, particle_backend, ball_count):
+    monkeypatch.setattr(current_code.settings, "particle_backend", particle_backend)
+    monkeypatch.setattr(current_code.settings, "ball_count", ball_count)
+    monkeypatch.setattr(current_code, "clock", StepClock())
+
+    headless_scores = current_code.run_headless(1, seed=seed)[:2]
+
+    random.seed(seed)
+    game = current_code.GameScene(1, controller=current_code.follow_ball_controller)
+    assert isinstance(game.run(), current_code.GameOverScene)
+
+    assert (game.paddle_1.score, game.paddle_2.score) == headless_scores
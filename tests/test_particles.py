@@ -0,0 +1,80 @@
+import pygame
+import pytest
+
+import current_code
+from current_code import AnalyticParticleSystem
+
+backends = [pytest.param(backend, marks=pytest.mark.skipif(backend == "numpy" and current_code.np is None,
+                                                            reason="numpy is not installed"))
+            for backend in current_code.particle_backends]
+
+# Spawned in this order, so the particles do not die in the order they were spawned.
+ages = [0.35, 0.85, 0.15, 0.95, 0.05, 0.55]
+
+
+def spawn_mixed_ages(backend):
+    particle_system = current_code.particle_backends[backend](lifetime=1, start_color=(255, 255, 255),
+                                                              end_color=(0, 0, 0), start_radius=2)
+    for age in ages:
+        particle_system.spawn(pos=(100, 100), vel=(10, 0), age=age)
+    assert not particle_system.in_spawn_order
+    return particle_system
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_remove_dead_particles_with_mixed_ages(backend):
+    particle_system = spawn_mixed_ages(backend)
+
+    for elapsed in (0.3, 0.6):
+        particle_system.simulate(0.3)
+        assert len(particle_system) == sum(age + elapsed < 1 for age in ages)
+
+    # The three left die in the order they were spawned.
+    assert particle_system.in_spawn_order
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_remove_oldest_with_mixed_ages(backend):
+    particle_system = spawn_mixed_ages(backend)
+
+    particle_system.remove_oldest()
+    particle_system.simulate(0.3)
+    assert len(particle_system) == sum(age + 0.3 < 1 for age in ages if age != max(ages))
+
+
+def test_analytic_seek_back_hides_particles_not_spawned_yet():
+    particle_system = AnalyticParticleSystem(lifetime=1, start_color=(255, 255, 255), end_color=(255, 255, 255),
+                                             start_radius=3, end_radius=3, particle_count=5, use_sprites=False)
+    particle_system.seek(0.5)
+    particle_system.create_collision_particles(pos=(100, 100))
+
+    surface = pygame.Surface((200, 200))
+    particle_system.render(surface, time=0.5)
+    assert surface.get_at((100, 100))[:3] == (255, 255, 255)
+
+    particle_system.seek(0.1)
+    assert len(particle_system) == 5
+
+    surface.fill((0, 0, 0))
+    particle_system.render(surface)
+    assert surface.get_at((100, 100))[:3] == (0, 0, 0)
+
+
+def test_governor_lowers_quality_for_slow_frames_and_raises_it_for_fast_ones():
+    governor = current_code.ParticleGovernor(target_frame_time=0.01, frames_per_check=5, min_quality=0.2)
+
+    def record_check(frame_time):
+        for i in range(governor.frames_per_check):
+            governor.record_frame(frame_time)
+        return governor.quality
+
+    assert record_check(0.0125) == pytest.approx(0.72)
+    for i in range(5):
+        assert record_check(0.05) == pytest.approx(0.2)
+
+    # Frames within the target, but without much time to spare, leave the quality alone.
+    assert record_check(0.009) == pytest.approx(0.2)
+
+    qualities = [record_check(0.005) for i in range(20)]
+    assert qualities == sorted(qualities)
+    assert qualities[-1] == 1.0
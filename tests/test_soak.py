@@ -0,0 +1,65 @@
+import gc
+import os
+import tracemalloc
+
+import pygame
+
+import current_code
+
+# The full soak is opt in, e.g. SOAK_REMATCHES=10000, since it takes several minutes.
+rematches = int(os.environ.get("SOAK_REMATCHES", "10"))
+
+# Enough for the countdown to end and the ball to reach a paddle.
+steps_per_rematch = 300
+
+
+def play(scene, steps):
+    """
+    Steps and draws [scene] like [GameScene.run] does, for at most [steps] frames.
+    Returns the game over scene if a player won meanwhile, else None.
+    """
+
+    for i in range(steps):
+        next_scene = scene.step(current_code.physics_dt)
+        if next_scene is not None:
+            return next_scene
+        scene.draw()
+        current_code.renderer.end_frame(current_code.screen)
+    return None
+
+
+def test_rematches_do_not_grow_memory(game_window, monkeypatch):
+    """
+    Plays rematches back to back through the scenes, without waiting for any input,
+    and checks that memory does not grow from one rematch to the next.
+    """
+
+    monkeypatch.setattr(current_code.renderer, "enabled", True)
+    score_required_to_win = 2
+    warmup_rematches = min(100, rematches // 2)
+
+    tracemalloc.start()
+    try:
+        scene = current_code.GameScene(score_required_to_win, controller=current_code.follow_ball_controller)
+        for i in range(rematches):
+            if i == warmup_rematches:
+                gc.collect()
+                start_bytes = tracemalloc.get_traced_memory()[0]
+
+            # Play part of the match, then player 1 wins and Space is pressed on the game over screen.
+            current_code.renderer.invalidate()
+            game_over = play(scene, steps_per_rematch)
+            if game_over is None:
+                scene.paddle_1.score = score_required_to_win
+                game_over = scene.run()
+            assert isinstance(game_over, current_code.GameOverScene)
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+            scene = game_over.run()
+            assert isinstance(scene, current_code.GameScene)
+
+        gc.collect()
+        end_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert end_bytes - start_bytes <= 64 * 1024, f"Memory grew by {end_bytes - start_bytes} bytes"